@@ -0,0 +1,737 @@
+# -------------------------------------------------------------------------------------------------------------------------------
+# Benchmarks for the twextract module
+# -------------------------------------------------------------------------------------------------------------------------------
+#   Each benchmark runs on synthetic data, so no Twitter credentials are required
+#
+#   !!Usage
+#       python benchmarks.py clean --n 1000000     (cleanText over Series.apply vs cleanText_batch)
+#       python benchmarks.py clean --ascii         (same, with texts without emojis or other non-ASCII characters)
+#       python benchmarks.py flatten --n 100000    (key loops + json_normalize + rename vs the single pass flattener)
+#       python benchmarks.py rowstore --n 100000   (bytes per tweet kept by lists of dicts, lists of values and ColumnStore)
+#       python benchmarks.py rebuild --n 100000    (tlminer rebuilt offline from a RawCache, and size of the cache on disk)
+#       python benchmarks.py postprocess --n 1000000 --workers 1 4 16   (postprocess scaling over a process pool)
+#       python benchmarks.py postprocess --raw-cache                     (same, with statuses read from a RawCache)
+#       python benchmarks.py postprocess --write                         (same, each shard written to a file by its worker)
+#       python benchmarks.py extraction            (tlminer and Friend_search end to end over a ReplayAPI, 1k to 100k tweets)
+#       python benchmarks.py extraction --sizes 1000 10000 --latency 0.05 --rate-limit 100
+#       python benchmarks.py async --accounts 50 --n 1000 --latency 0.1   (sync tweepy vs AsyncAPI against a local mock server)
+#       python benchmarks.py options --n 10000     (tlminer with type filters, a created_at window and a columns projection)
+#       python benchmarks.py check                 (checks of filters, merges, journals and batch_extract, fail with asserts)
+# -------------------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import concurrent.futures
+import http.server
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import threading
+import urllib.parse
+
+import pandas as pd
+import requests
+import tweepy
+
+import twextract
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Synthetic tweet texts with mentions, hashtags, retweet marks, urls, numbers, punctuations and emojis
+# -------------------------------------------------------------------------------------------------------------------------------
+def synthetic_texts(n, seed = 0, ascii = False):
+    rnd = random.Random(seed)
+    words = ['RT', '@robguilarr', '#python', 'https://www.example.com/path', 'http://t.co/xYz12', 'data', 'Timeline',
+             'mining', 'tweets', '2022', 'v4.4.0', 'hello!', 'mail@example.com', 'Twitter', 'API']
+    if not ascii:
+        words += ['don’t', '😀', '🚀', '🇺🇸']
+    return [' '.join(rnd.choice(words) for _ in range(rnd.randint(5, 25))) for _ in range(n)]
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Synthetic user and status dictionaries, with the shape of Twitter API v1.1 responses
+# -------------------------------------------------------------------------------------------------------------------------------
+def synthetic_user(user_id):
+    return {'id': user_id, 'id_str': str(user_id), 'name': f'User {user_id}', 'screen_name': f'user{user_id}',
+            'location': '', 'description': f'Profile of @user{user_id} #data https://example.com', 'protected': False,
+            'followers_count': 100 + user_id % 5000, 'friends_count': 50 + user_id % 700, 'listed_count': 3,
+            'created_at': 'Tue Mar 01 10:00:00 +0000 2022', 'favourites_count': 20 + user_id % 900, 'verified': False,
+            'statuses_count': 1 + user_id % 12000, 'lang': None}
+
+def synthetic_statuses(n, seed = 0, user_id = 1):
+    rnd = random.Random(seed)
+    texts = synthetic_texts(min(n, 1000), seed = seed)
+    statuses = []
+    for i in range(n):
+        status = {'created_at': 'Wed Mar 02 10:%02d:%02d +0000 2022' % (i // 60 % 60, i % 60),
+                  'id': 1500000000000000000 - i, 'id_str': str(1500000000000000000 - i), 'full_text': texts[i % len(texts)],
+                  'truncated': False, 'display_text_range': [0, 140],
+                  'entities': {'hashtags': [{'text': 'python', 'indices': [0, 7]}], 'symbols': [], 'urls': [],
+                               'user_mentions': [{'screen_name': 'robguilarr', 'id': 7, 'indices': [8, 19]}]},
+                  'source': 'Twitter Web App', 'in_reply_to_status_id': None, 'in_reply_to_status_id_str': None,
+                  'in_reply_to_user_id': None, 'in_reply_to_user_id_str': None, 'in_reply_to_screen_name': None,
+                  'user': synthetic_user(user_id), 'geo': None, 'coordinates': None, 'place': None, 'contributors': None,
+                  'is_quote_status': False, 'retweet_count': rnd.randint(0, 50), 'favorite_count': rnd.randint(0, 90),
+                  'favorited': rnd.random() < 0.3, 'retweeted': False, 'lang': 'en'}
+        kind = rnd.random()
+        # 40% tweets, 20% retweets, 20% quoted tweets, 20% replies
+        if kind < 0.2:
+            status['retweeted_status'] = {'id': i, 'full_text': status['full_text'], 'user': synthetic_user(1000 + i % 500)}
+        elif kind < 0.4:
+            status['quoted_status'] = {'id': i, 'full_text': status['full_text'], 'user': synthetic_user(2000 + i % 500)}
+        elif kind < 0.6:
+            replied = 3000 + i % 500
+            status.update({'in_reply_to_status_id': i, 'in_reply_to_status_id_str': str(i), 'in_reply_to_user_id': replied,
+                           'in_reply_to_user_id_str': str(replied), 'in_reply_to_screen_name': f'user{replied}'})
+        statuses.append(status)
+    return statuses
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Function to time a callable, returns (seconds, result)
+# -------------------------------------------------------------------------------------------------------------------------------
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# cleanText row by row (Series.apply) against cleanText_batch
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_clean(n, ascii = False):
+    texts = pd.Series(synthetic_texts(n, ascii = ascii))
+    apply_time, expected = timed(texts.apply, twextract.cleanText)
+    batch_time, result = timed(twextract.cleanText_batch, texts)
+    print(f'cleanText on {n:,} texts')
+    print(f'  Series.apply(cleanText): {apply_time:8.2f} s')
+    print(f'  cleanText_batch:         {batch_time:8.2f} s   ({apply_time / batch_time:.1f}x)')
+    print(f'  identical output:        {expected.equals(result)}')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Previous flattening, kept as baseline: key loops with string concatenation by tweet, json_normalize and dict_changer rename
+# -------------------------------------------------------------------------------------------------------------------------------
+def legacy_flatten(miner, newtweets):
+    subsets = {'Tweet': [], 'Retweet': [], 'Quoted': [], 'Replied': []}
+    keys = {'Tweet': miner.tweets_keys, 'Retweet': miner.retweets_keys,
+            'Quoted': miner.quotes_keys, 'Replied': miner.replies_keys}
+    for newtweet in newtweets:
+        kind = twextract.tweet_kind(newtweet)
+        status = dict()
+        for key in keys[kind]:
+            if key in ['quoted_status', 'retweeted_status']:
+                for i in miner.in_user_cols:
+                    status[key + '.user.' + i] = newtweet[key]['user'][i]
+            elif key == 'entities':
+                for i in miner.in_entities_cols:
+                    status['entities.' + i] = newtweet[key][i]
+            elif key == 'user':
+                for i in miner.in_user_cols:
+                    status['user.' + i] = newtweet[key][i]
+            elif key == 'full_text':
+                try:
+                    status[key] = newtweet[key]
+                except:
+                    status[key] = newtweet['text']
+            else:
+                status[key] = newtweet[key]
+        if kind == 'Replied':
+            status = {**status, **miner.get_user_info(user_id = newtweet['in_reply_to_user_id_str'], kind = 'target_node')}
+        subsets[kind].append(status)
+    frames = []
+    for kind, tweets_list in subsets.items():
+        df = pd.json_normalize(tweets_list).rename(columns = miner.dict_changer)
+        df['type'] = [kind for i in range(df.shape[0])]
+        frames.append(df)
+    return frames
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Single pass flattener: values by tweet in the final columns order, dataframes built from records
+# -------------------------------------------------------------------------------------------------------------------------------
+def spec_flatten(miner, newtweets):
+    subsets = {'Tweet': [], 'Retweet': [], 'Quoted': [], 'Replied': []}
+    for newtweet in newtweets:
+        kind, values = miner.subset_tweet(newtweet)
+        subsets[kind].append(values)
+    return [pd.DataFrame.from_records(tweets_list, columns = miner.flat_specs[kind][0])
+            for kind, tweets_list in subsets.items()]
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Function to measure seconds and peak traced memory of a callable, returns (seconds, peak bytes, result)
+# -------------------------------------------------------------------------------------------------------------------------------
+def profiled(function, *args):
+    tracemalloc.start()
+    seconds, result = timed(function, *args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Flattening per tweet: previous key loops + json_normalize + rename against the single pass flattener
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_flatten(n):
+    newtweets = synthetic_statuses(n)
+    # Miner without API requests, replied users are served from its cache
+    miner = twextract.Miner('bench', n, None, None, None, None, None, run = False)
+    for newtweet in newtweets:
+        if newtweet['in_reply_to_user_id_str'] is not None:
+            miner.user_cache.set(newtweet['in_reply_to_user_id_str'], synthetic_user(int(newtweet['in_reply_to_user_id_str'])))
+    print(f'Flattening {n:,} tweets')
+    results = []
+    for name, function in [('key loops + json_normalize', legacy_flatten), ('single pass flattener', spec_flatten)]:
+        # Timing without tracing, memory in a second run
+        seconds, frames = timed(function, miner, newtweets)
+        _, peak, _ = profiled(function, miner, newtweets)
+        results.append(frames)
+        print(f'  {name:28} {seconds / n * 1e6:8.2f} us/tweet   peak {peak / n:8.0f} bytes/tweet')
+    same = all(legacy.reindex(columns = new.columns).equals(new) for legacy, new in zip(*results))
+    print(f'  identical frames:            {same}')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Memory kept by the accumulated rows of a timeline, as lists of dicts (before the single pass flattener), lists of values and
+# ColumnStore. Statuses are kept alive during the measure, so only the memory added by each accumulator is counted
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_rowstore(n):
+    newtweets = synthetic_statuses(n)
+    miner = twextract.Miner('bench', n, None, None, None, None, None, run = False)
+    for newtweet in newtweets:
+        if newtweet['in_reply_to_user_id_str'] is not None:
+            miner.user_cache.set(newtweet['in_reply_to_user_id_str'], synthetic_user(int(newtweet['in_reply_to_user_id_str'])))
+
+    def dicts():
+        subsets = {kind : [] for kind in miner.flat_specs}
+        for newtweet in newtweets:
+            kind, values = miner.subset_tweet(newtweet)
+            subsets[kind].append(dict(zip(miner.flat_specs[kind][0], values)))
+        return subsets
+
+    def lists():
+        subsets = {kind : [] for kind in miner.flat_specs}
+        for newtweet in newtweets:
+            kind, values = miner.subset_tweet(newtweet)
+            subsets[kind].append(values)
+        return subsets
+
+    def stores():
+        subsets = {'Tweet': miner.tweets, 'Replied': miner.replies, 'Retweet': miner.retweets, 'Quoted': miner.quotes}
+        for newtweet in newtweets:
+            kind, values = miner.subset_tweet(newtweet)
+            subsets[kind].append(values)
+        return subsets
+
+    print(f'Rows kept for {n:,} tweets')
+    for name, function in [('lists of dicts', dicts), ('lists of values', lists), ('ColumnStore', stores)]:
+        tracemalloc.start()
+        seconds, subsets = timed(function)
+        kept = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'  {name:16} {kept / n:8.0f} bytes/tweet   {seconds / n * 1e6:6.2f} us/tweet')
+        del subsets
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Local API with a synthetic timeline of n tweets for 'bench' (replied users included) and n friends for 'bench'
+# -------------------------------------------------------------------------------------------------------------------------------
+def synthetic_api(n, latency = 0, rate_limit = None):
+    users = [synthetic_user(user_id) for user_id in range(3000, 3500)] + [synthetic_user(user_id) for user_id in range(10000, 10000 + n)]
+    rate_limits = {endpoint : rate_limit for endpoint in ['user_timeline', 'lookup_users', 'get_friends']} if rate_limit else None
+    return twextract.ReplayAPI(statuses = {'bench': synthetic_statuses(n)}, users = users,
+                               friends = {'bench': list(range(10000, 10000 + n))},
+                               latency = latency, rate_limits = rate_limits, window = 1)
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# End to end extraction: throughput, peak memory and API calls of tlminer (in memory and stream modes) and Friend_search
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_extraction(sizes, latency = 0, rate_limit = None):
+    extractors = [('tlminer', lambda api, n, path: twextract.tlminer('bench', n, path, None, None, None, None, api = api)),
+                  ('tlminer stream', lambda api, n, path: twextract.tlminer('bench', n, path, None, None, None, None,
+                                                                            api = api, stream = True)),
+                  ('Friend_search', lambda api, n, path: twextract.Friend_search('bench', n, path, None, None, None, None,
+                                                                                 api = api))]
+    print(f'Extraction over ReplayAPI (latency {latency} s, rate limit {rate_limit or "none"} calls/s by endpoint)')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'output.csv')
+        for n in sizes:
+            for name, extractor in extractors:
+                # Timing without tracing, memory in a second run (both with a fresh API and calls counter)
+                api = synthetic_api(n, latency, rate_limit)
+                seconds, _ = timed(extractor, api, n, path)
+                _, peak, _ = profiled(extractor, synthetic_api(n, latency, rate_limit), n, path)
+                calls = ', '.join(f'{endpoint} {count}' for endpoint, count in sorted(api.calls.items()))
+                print(f'  {n:>7,} {name:15} {n / seconds:10,.0f} rows/s   peak {peak / 2**20:8.1f} MB   '
+                      f'calls: {calls}   429s: {api.rate_limited}')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Offline rebuild: raw statuses and users saved in a RawCache, then tlminer (stream mode) reads them back as its API
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_rebuild(n):
+    with tempfile.TemporaryDirectory() as directory:
+        raw = twextract.RawCache(os.path.join(directory, 'raw.db'))
+        api = synthetic_api(n)
+        seconds, _ = timed(twextract.tlminer, 'bench', n, os.path.join(directory, 'online.csv'), None, None, None, None,
+                           api = api, stream = True, raw_cache = raw)
+        size = os.path.getsize(raw.path)
+        print(f'RawCache of {n:,} tweets: {size / n:,.0f} bytes/tweet on disk')
+        print(f'  extraction over ReplayAPI, saving raw responses: {n / seconds:10,.0f} tweets/s')
+        seconds, _ = timed(twextract.tlminer, 'bench', n, os.path.join(directory, 'offline.csv'), None, None, None, None,
+                           api = raw, stream = True)
+        print(f'  offline rebuild from RawCache:                   {n / seconds:10,.0f} tweets/s   calls: {raw.calls}')
+        with open(os.path.join(directory, 'online.csv')) as online, open(os.path.join(directory, 'offline.csv')) as offline:
+            print(f'  identical output:                                {online.read() == offline.read()}')
+        raw.close()
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Scaling of postprocess: one process (transform_shard over all tweets, as tlminer does) against process pools of each size.
+# Statuses are generated by blocks while they are consumed, so large sizes fit in memory. With raw_cache they are saved in a
+# RawCache first (not timed), and read back as compressed json decoded by the workers. With write, the single process writes
+# its dataframe to a csv file and the pools write a file by shard, instead of merging the shards in memory
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_postprocess(n, workers, shard_size = 50000, raw_cache = False, write = False):
+    def generated():
+        blocks = (synthetic_statuses(min(10000, n - start), seed = start) for start in range(0, n, 10000))
+        return itertools.chain.from_iterable(blocks)
+    users = {str(user_id) : synthetic_user(user_id) for user_id in range(3000, 3500)}
+    with tempfile.TemporaryDirectory() as directory:
+        # Inputs (statuses, users) of the single process and of the process pools
+        if raw_cache:
+            raw = twextract.RawCache(os.path.join(directory, 'raw.db'))
+            blocks = generated()
+            for start in range(0, n, 10000):
+                block = list(itertools.islice(blocks, 10000))
+                # Unique ids, the generator repeats them by block
+                for status in block:
+                    status['id'] += start * 10**7
+                raw.add_statuses('bench', block)
+            raw.add_users(list(users.values()))
+            single_input = lambda: (list(raw.iter_statuses()), raw.path)
+            pool_input = lambda: (raw.iter_statuses(raw = True), raw)
+        else:
+            single_input = lambda: (list(generated()), list(users.values()))
+            pool_input = lambda: (generated(), users)
+
+        print(f'postprocess of {n:,} tweets, shards of {shard_size:,} ({os.cpu_count()} CPUs available, '
+              f'statuses from {"RawCache" if raw_cache else "memory"}, output {"files" if write else "in memory"})')
+        single_path = os.path.join(directory, 'single.csv') if write else None
+        single = timed(lambda: twextract.transform_shard(*single_input(), path = single_path))[0]
+        print(f'  single process:       {single:8.2f} s   {n / single:10,.0f} tweets/s')
+        for max_workers in workers:
+            pool_path = os.path.join(directory, f'pool_{max_workers}') if write else None
+            seconds = timed(lambda: twextract.postprocess(*pool_input(), path = pool_path, max_workers = max_workers,
+                                                          shard_size = shard_size))[0]
+            print(f'  {max_workers:3} processes:        {seconds:8.2f} s   {n / seconds:10,.0f} tweets/s   ({single / seconds:.1f}x)')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Timeline options: API calls, seconds and rows of tlminer with type filters, a created_at window (the newest
+# 10% of the timeline) and a projection of a few columns, against the whole timeline
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_options(n):
+    statuses = synthetic_statuses(n)
+    # One tweet by minute, so the snowflake ids carry distinct creation times
+    for i, status in enumerate(statuses):
+        status['id'] = 1500000000000000000 - i * 60000 * 2**22
+    since = twextract.status_time(statuses[n // 10])
+    options = [('whole timeline', {}),
+               ('include_rts=False, exclude_replies=True', {'include_rts': False, 'exclude_replies': True}),
+               ('newest 10% by created_at', {'since': since}),
+               ('columns tweet_id, created_at, type', {'columns': ['tweet_id', 'created_at', 'type']})]
+    print(f'tlminer options over a timeline of {n:,} tweets')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'output.csv')
+        for name, kwargs in options:
+            api = twextract.ReplayAPI(statuses = {'bench': statuses},
+                                      users = [synthetic_user(user_id) for user_id in range(3000, 3500)])
+            seconds, miner = timed(twextract.tlminer, 'bench', None, path, None, None, None, None, api = api, **kwargs)
+            calls = ', '.join(f'{endpoint} {count}' for endpoint, count in sorted(api.calls.items()))
+            print(f'  {name:40} {seconds:7.2f} s   {len(miner.data):>7,} rows x {len(miner.data.columns):2}   calls: {calls}')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Local mock of the API v1.1 endpoints used by the miners, answering from a ReplayAPI after 'latency' seconds by request
+# (one thread by connection, connections are kept alive). The url of the API is f'http://127.0.0.1:{server.server_port}/1.1/'
+# -------------------------------------------------------------------------------------------------------------------------------
+class MockServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, replay, latency = 0):
+        self.replay = replay
+        self.latency = latency
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        threading.Thread(target = self.serve_forever, daemon = True).start()
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        # tweepy sends users/lookup as a form
+        if self.command == 'POST':
+            params.update(urllib.parse.parse_qsl(self.rfile.read(int(self.headers['Content-Length'])).decode()))
+        for key in ['count', 'max_id', 'since_id', 'cursor']:
+            if key in params:
+                params[key] = int(params[key])
+        for key in ['include_rts', 'exclude_replies']:
+            if key in params:
+                params[key] = params[key].lower() in ['true', '1']
+        if 'user_id' in params and url.path.endswith('lookup.json'):
+            params['user_id'] = params['user_id'].split(',')
+        replay = self.server.replay
+        time.sleep(self.server.latency)
+        try:
+            if url.path.endswith('statuses/user_timeline.json'):
+                body = replay.user_timeline(**params)
+            elif url.path.endswith('users/lookup.json'):
+                body = replay.lookup_users(**params)
+            elif url.path.endswith('users/show.json'):
+                body = replay.get_user(**params)
+            elif url.path.endswith('friends/list.json'):
+                users, (previous_cursor, next_cursor) = replay.get_friends(**params)
+                body = {'users': users, 'previous_cursor': previous_cursor, 'next_cursor': next_cursor}
+            else:
+                ids, (previous_cursor, next_cursor) = replay.get_friend_ids(**params)
+                body = {'ids': ids, 'previous_cursor': previous_cursor, 'next_cursor': next_cursor}
+            status, headers = 200, {}
+        except tweepy.HTTPException as error:
+            body, status, headers = json.loads(error.response.content), error.response.status_code, error.response.headers
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+# Requests adapter that sends the https urls of tweepy to the plain http mock server
+class PlainHTTPAdapter(requests.adapters.HTTPAdapter):
+    def send(self, request, **kwargs):
+        request.url = 'http://' + request.url[len('https://'):]
+        return super().send(request, **kwargs)
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Async extraction: tlminer over many accounts with tweepy (one account after the other, and in threads sharing the API) vs
+# async_extract with AsyncAPI, all against the local mock server. The 'data' of each account has to be the same
+# -------------------------------------------------------------------------------------------------------------------------------
+def bench_async(accounts, n, latency = 0.1, max_concurrency = 16, threads = 8):
+    usernames = [f'bench{k}' for k in range(accounts)]
+    replay = twextract.ReplayAPI(statuses = {username: synthetic_statuses(n, seed = k) for k, username in enumerate(usernames)},
+                                 users = [synthetic_user(user_id) for user_id in range(3000, 3500)])
+    server = MockServer(replay, latency)
+    host = f'127.0.0.1:{server.server_port}'
+    sync_api = twextract.build_api('key', 'secret', 'token', 'token secret', wait_on_rate_limit = False)
+    sync_api.host = host
+    sync_api.session.mount(f'https://{host}', PlainHTTPAdapter())
+
+    print(f'{accounts} accounts of {n:,} tweets against a mock server (latency {latency} s by request)')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, '{username}.csv')
+        def extract(username):
+            return twextract.tlminer(username, n, path.format(username = username), None, None, None, None, api = sync_api)
+        def sequential():
+            return {username: extract(username) for username in usernames}
+        def threaded():
+            with concurrent.futures.ThreadPoolExecutor(max_workers = threads) as executor:
+                return dict(zip(usernames, executor.map(extract, usernames)))
+        async def asynchronous():
+            async_api = twextract.AsyncAPI('key', 'secret', 'token', 'token secret', host = f'http://{host}/1.1/')
+            try:
+                return await twextract.async_extract(usernames, n, path, async_api, max_concurrency = max_concurrency)
+            finally:
+                await async_api.close()
+
+        expected = None
+        for name, run in [('sync', sequential), (f'sync {threads} threads', threaded),
+                          (f'async {max_concurrency} accounts', lambda: asyncio.run(asynchronous()))]:
+            replay.calls.clear()
+            seconds, results = timed(run)
+            failed = [result for result in results.values() if isinstance(result, Exception)]
+            if failed:
+                raise failed[0]
+            data = {username: result.data for username, result in results.items()}
+            expected = expected if expected is not None else data
+            same = all(data[username].equals(expected[username]) for username in usernames)
+            print(f'  {name:20} {seconds:8.2f} s   {accounts * n / seconds:10,.0f} tweets/s   '
+                  f'{sum(replay.calls.values()):5} requests   same data: {same}')
+    server.shutdown()
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# ReplayAPI failing with a RuntimeError once an endpoint has been called 'fail_after' times, to interrupt an extraction
+# -------------------------------------------------------------------------------------------------------------------------------
+class FailingAPI(twextract.ReplayAPI):
+    def __init__(self, fail_after, **kwargs):
+        super().__init__(**kwargs)
+        # Calls allowed by endpoint
+        self.fail_after = fail_after
+
+    def request(self, endpoint):
+        if self.calls.get(endpoint, 0) >= self.fail_after.get(endpoint, float('inf')):
+            raise RuntimeError(f'{endpoint} interrupted')
+        super().request(endpoint)
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# ReplayAPI answering the timelines of 'protected' screen names with a 401 Unauthorized error, as Twitter does
+# -------------------------------------------------------------------------------------------------------------------------------
+class ProtectedAPI(twextract.ReplayAPI):
+    def __init__(self, protected, **kwargs):
+        super().__init__(**kwargs)
+        self.protected = set(protected)
+
+    def user_timeline(self, screen_name = None, **kwargs):
+        if screen_name in self.protected:
+            raise self.error(401, 'Unauthorized', 89, 'Not authorized.')
+        return super().user_timeline(screen_name = screen_name, **kwargs)
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Checks of the extraction options over ReplayAPI timelines: each one raises an AssertionError when its output is wrong
+# (the benchmarks only print how fast they are). The timeline starts with 250 retweets, more than a page of 200
+# -------------------------------------------------------------------------------------------------------------------------------
+def run_checks(n = 1000):
+    statuses = synthetic_statuses(n)
+    # One tweet by minute, so the snowflake ids carry distinct creation times
+    for i, status in enumerate(statuses):
+        status['id'] = 1500000000000000000 - i * 60000 * 2**22
+    for status in statuses[:250]:
+        status.pop('quoted_status', None)
+        status['retweeted_status'] = {'id': 1, 'full_text': status['full_text'], 'user': synthetic_user(5)}
+    users = [synthetic_user(user_id) for user_id in range(3000, 3500)]
+    api = lambda statuses = statuses: twextract.ReplayAPI(statuses = {'bench': statuses}, users = users)
+    miner = lambda path, *args, **kwargs: twextract.tlminer('bench', None, path, None, None, None, None, *args, **kwargs)
+    read = twextract.CSVWriter().read
+    # Outputs compared by tweet, stream mode writes the rows in timeline order and the in memory mode by type of tweet
+    same = lambda df, other: df.sort_values('tweet_id').reset_index(drop = True).equals(
+        other.sort_values('tweet_id').reset_index(drop = True))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = lambda name: os.path.join(directory, name)
+        full = miner(path('full.csv'), api = api()).data
+        assert len(full) == n, f'whole timeline: {len(full)} rows, expected {n}'
+
+        # Type filters, pages of retweets only are skipped without ending the timeline
+        originals = [status['id'] for status in twextract.filter_timeline(statuses, include_rts = False)]
+        filtered = miner(path('filtered.csv'), api = api(), include_rts = False).data
+        assert sorted(filtered['tweet_id']) == sorted(originals), f'include_rts=False: {len(filtered)} rows, expected {len(originals)}'
+        print(f'  filters                  ok   {len(filtered)} of {n} tweets without retweets')
+
+        # Filters within a created_at window, the first page is filtered out entirely
+        since = twextract.status_time(statuses[n // 2])
+        windowed = [status['id'] for status in twextract.filter_timeline(statuses[:n // 2 + 1], include_rts = False)]
+        filtered = miner(path('filtered_window.csv'), api = api(), include_rts = False, since = since).data
+        assert sorted(filtered['tweet_id']) == sorted(windowed), \
+            f'include_rts=False, since: {len(filtered)} rows, expected {len(windowed)}'
+        print(f'  filters and window       ok   {len(filtered)} tweets without retweets since {since:%Y-%m-%d %H:%M}')
+
+        # Stream mode writes the same output as the in memory mode
+        miner(path('stream.csv'), api = api(), stream = True)
+        assert same(read(path('stream.csv')), read(path('full.csv'))), 'stream output differs from the in memory output'
+        # An empty timeline still writes the output with its columns
+        miner(path('stream_empty.csv'), api = api([]), stream = True)
+        empty = read(path('stream_empty.csv'))
+        assert empty.empty and list(empty.columns) == list(full.columns), f'empty stream: {empty.shape}'
+        print('  stream                   ok   also an empty timeline')
+
+        # Parquet and Feather outputs of an empty timeline, with the columns of the schema
+        for writer in [twextract.ParquetWriter(), twextract.FeatherWriter()]:
+            output = path('empty' + writer.extension)
+            miner(output, api = api([]), writer = writer)
+            empty = writer.read(output)
+            assert empty.empty and list(empty.columns) == list(full.columns), f'empty {writer.extension}: {empty.shape}'
+        print('  empty Parquet/Feather    ok')
+
+        # A partitioned dataset is written again over itself, but a directory it didn't write is kept
+        writer = twextract.ParquetWriter(partition_cols = ['source_node.screen_name', 'date'])
+        for _ in range(2):
+            miner(path('dataset'), api = api(), writer = writer)
+        assert len(writer.read(path('dataset'))) == n, 'partitioned dataset written twice differs from the timeline'
+        os.makedirs(path('unrelated'))
+        open(path('unrelated/notes.txt'), 'w').close()
+        try:
+            miner(path('unrelated'), api = api(), writer = writer)
+            raise AssertionError('a partitioned output replaced a directory it did not write')
+        except ValueError:
+            pass
+        assert os.listdir(path('unrelated')) == ['notes.txt'], f'unrelated directory changed: {os.listdir(path("unrelated"))}'
+        print('  partitioned Parquet      ok   rewritten, other directories kept')
+
+        # Checkpoints: a second run requests the new tweets only and merges the previous output after them
+        for stream in [False, True]:
+            output = path(f'merged_{stream}.csv')
+            checkpoint = twextract.CheckpointStore(path(f'checkpoint_{stream}.json'))
+            miner(output, api = api(statuses[300:]), checkpoint = checkpoint, stream = stream)
+            second = api()
+            miner(output, api = second, checkpoint = checkpoint, stream = stream)
+            assert same(read(output), read(path('full.csv'))), f'checkpoint merge (stream={stream}) differs from the timeline'
+            assert second.calls['user_timeline'] == 3, f'checkpoint (stream={stream}): {second.calls} calls'
+            assert not os.path.exists(output + '.new'), f'{output}.new left after the merge'
+            # A refresh without new tweets keeps the output and the checkpoint as they were
+            state = checkpoint.get_state('bench')
+            quiet = api()
+            miner(output, api = quiet, checkpoint = checkpoint, stream = stream)
+            assert same(read(output), read(path('full.csv'))), f'refresh without new tweets (stream={stream}) changed the output'
+            assert checkpoint.get_state('bench') == state, f'refresh without new tweets (stream={stream}): {checkpoint.get_state("bench")}'
+            assert quiet.calls['user_timeline'] == 1, f'refresh without new tweets (stream={stream}): {quiet.calls} calls'
+        print('  checkpoint merge         ok   in memory and stream modes, also without new tweets')
+
+        # Refreshes stopped by max_length continue below the oldest tweet received, down to the checkpoint
+        output = path('refreshed.csv')
+        checkpoint = twextract.CheckpointStore(path('checkpoint_refreshed.json'))
+        miner(output, api = api(statuses[600:]), checkpoint = checkpoint)
+        for refresh in range(3):
+            twextract.tlminer('bench', 200, output, None, None, None, None, api = api(), checkpoint = checkpoint)
+            rows = len(read(output))
+            assert rows == 400 + 200 * (refresh + 1), f'refresh {refresh + 1} with max_length=200: {rows} rows'
+        last = api()
+        miner(output, api = last, checkpoint = checkpoint)
+        assert same(read(output), read(path('full.csv'))), 'refreshed output differs from the timeline'
+        assert checkpoint.get_state('bench') == {'since_id': statuses[0]['id']}, f'checkpoint: {checkpoint.get_state("bench")}'
+        print('  checkpoint max_length    ok   600 new tweets requested in 3 refreshes of 200')
+
+        # Projection without tweet_id, merged in stream mode
+        output = path('projected.csv')
+        checkpoint = twextract.CheckpointStore(path('checkpoint_projected.json'))
+        for timeline in [statuses[300:], statuses]:
+            miner(output, api = api(timeline), checkpoint = checkpoint, stream = True, columns = ['full_text', 'type'])
+        projected = read(output)
+        assert projected.shape == (n, 2), f'projection merge: {projected.shape}, expected {(n, 2)}'
+        assert not os.path.exists(output + '.new'), f'{output}.new left after the merge'
+        print('  projection merge         ok   without tweet_id')
+
+        # Projection without the partition columns of the writer, refused before any request
+        partitioned = api()
+        try:
+            miner(path('partitioned'), api = partitioned, columns = ['tweet_id', 'full_text'],
+                  writer = twextract.ParquetWriter(partition_cols = ['source_node.screen_name', 'date']))
+            raise AssertionError('a projection without the partition columns was accepted')
+        except ValueError:
+            pass
+        assert not partitioned.calls, f'projection without the partition columns: {partitioned.calls} calls'
+        print('  projection partitions    ok   refused before any request')
+
+        # Journal: an interrupted timeline is resumed without requesting its saved pages again
+        journal = path('timeline.jsonl')
+        try:
+            miner(path('resumed.csv'), api = FailingAPI({'user_timeline': 3}, statuses = {'bench': statuses}, users = users),
+                  journal = journal)
+            raise AssertionError('the interrupted timeline did not fail')
+        except RuntimeError:
+            pass
+        try:
+            twextract.tlminer('bench', n // 2, path('other.csv'), None, None, None, None, api = api(), journal = journal)
+            raise AssertionError('a journal of another extraction was replayed')
+        except ValueError:
+            pass
+        resumed_api = api()
+        resumed = miner(path('resumed.csv'), api = resumed_api, journal = journal).data
+        assert resumed.equals(full), 'resumed timeline differs from the timeline'
+        assert resumed_api.calls['user_timeline'] == 3, f'resumed timeline: {resumed_api.calls} calls'
+        assert not os.path.exists(journal), 'timeline journal left after the output was written'
+        print('  timeline journal         ok   resumed after 3 pages')
+
+        # Crawler journal, same checks on the friends graph
+        nodes = [synthetic_user(user_id) for user_id in range(1, 301)]
+        friends = {str(user_id): [(user_id * 7 + k) % 300 + 1 for k in range(12)] for user_id in range(1, 301)}
+        crawl = lambda api, depth = 2, **kwargs: twextract.Friend_crawler('user1', depth, path('graph.csv'), None, None, None,
+                                                                          None, max_length = 10, api = api, **kwargs)
+        expected = crawl(twextract.ReplayAPI(users = nodes, friends = friends))
+        journal = path('crawl.jsonl')
+        try:
+            crawl(FailingAPI({'get_friend_ids': 5}, users = nodes, friends = friends), journal = journal)
+            raise AssertionError('the interrupted crawl did not fail')
+        except RuntimeError:
+            pass
+        try:
+            crawl(twextract.ReplayAPI(users = nodes, friends = friends), depth = 3, journal = journal)
+            raise AssertionError('a journal of another crawl was replayed')
+        except ValueError:
+            pass
+        resumed = crawl(twextract.ReplayAPI(users = nodes, friends = friends), journal = journal)
+        assert sorted(map(tuple, resumed.edges.values)) == sorted(map(tuple, expected.edges.values)), 'resumed crawl edges differ'
+        assert resumed.nodes.sort_values('id').reset_index(drop = True).equals(
+            expected.nodes.sort_values('id').reset_index(drop = True)), 'resumed crawl nodes differ'
+        assert not os.path.exists(journal), 'crawl journal left after the output was written'
+        print('  crawler journal          ok')
+
+        # batch_extract over API objects, sharing Metrics until the last miner is done (also when one of them fails)
+        metrics = twextract.Metrics(memory = True)
+        results = twextract.batch_extract(['bench', 'protected', 'other'], None, path('batch_{username}.csv'),
+                                          apis = [ProtectedAPI(['protected'], statuses = {'bench': statuses, 'other': statuses},
+                                                               users = users) for _ in range(2)], metrics = metrics)
+        assert isinstance(results.pop('protected'), tweepy.Unauthorized), 'batch_extract of a protected user did not fail'
+        for username, result in results.items():
+            assert not isinstance(result, Exception), f'batch_extract {username}: {result!r}'
+            assert result.data.equals(full), f'batch_extract {username}: data differs from the timeline'
+        report = metrics.report()
+        assert metrics.finished is not None and not tracemalloc.is_tracing(), f'metrics not stopped: {report}'
+        assert report['tweets'] == 2 * n and report['peak_memory'], f'metrics: {report}'
+        # Crawls take the hops from 'depth', max_length caps the friends by node as in Friend_crawler
+        crawls = twextract.batch_extract(['user1'], 10, path('batch_{username}_graph.csv'), miner = twextract.Friend_crawler,
+                                         depth = 2, apis = [twextract.ReplayAPI(users = nodes, friends = friends)])
+        assert sorted(map(tuple, crawls['user1'].edges.values)) == sorted(map(tuple, expected.edges.values)), \
+            'batch_extract crawl edges differ from the crawl'
+        try:
+            twextract.batch_extract(['bench'], None, path('batch.csv'), apis = [api()])
+            raise AssertionError('batch_extract accepted a path without {username}')
+        except ValueError:
+            pass
+        print('  batch_extract            ok   3 users over API objects (1 protected), shared metrics, and a crawl')
+    print('All checks passed')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'twextract benchmarks')
+    subparsers = parser.add_subparsers(dest = 'benchmark', required = True)
+    clean = subparsers.add_parser('clean', help = 'cleanText over Series.apply vs cleanText_batch')
+    clean.add_argument('--n', type = int, default = 1000000)
+    clean.add_argument('--ascii', action = 'store_true', help = 'texts without non-ASCII characters')
+    flatten = subparsers.add_parser('flatten', help = 'key loops + json_normalize + rename vs the single pass flattener')
+    flatten.add_argument('--n', type = int, default = 100000)
+    rowstore = subparsers.add_parser('rowstore', help = 'bytes per tweet kept by lists of dicts, lists of values and ColumnStore')
+    rowstore.add_argument('--n', type = int, default = 100000)
+    rebuild = subparsers.add_parser('rebuild', help = 'tlminer rebuilt offline from a RawCache')
+    rebuild.add_argument('--n', type = int, default = 100000)
+    postprocess = subparsers.add_parser('postprocess', help = 'postprocess scaling over a process pool')
+    postprocess.add_argument('--n', type = int, default = 1000000)
+    postprocess.add_argument('--workers', type = int, nargs = '+', default = [1, 4, 16])
+    postprocess.add_argument('--shard-size', type = int, default = 50000)
+    postprocess.add_argument('--raw-cache', action = 'store_true', help = 'statuses read from a RawCache')
+    postprocess.add_argument('--write', action = 'store_true', help = 'shards written as csv files instead of merged in memory')
+    extraction = subparsers.add_parser('extraction', help = 'tlminer and Friend_search end to end over a ReplayAPI')
+    extraction.add_argument('--sizes', type = int, nargs = '+', default = [1000, 10000, 100000])
+    extraction.add_argument('--latency', type = float, default = 0, help = 'seconds by API call')
+    extraction.add_argument('--rate-limit', type = int, default = None, help = 'calls per second by endpoint before a 429')
+    asynchronous = subparsers.add_parser('async', help = 'sync tweepy vs AsyncAPI extraction against a local mock server')
+    asynchronous.add_argument('--accounts', type = int, default = 50)
+    asynchronous.add_argument('--n', type = int, default = 1000, help = 'tweets by account')
+    asynchronous.add_argument('--latency', type = float, default = 0.1, help = 'seconds by request')
+    asynchronous.add_argument('--max-concurrency', type = int, default = 16, help = 'accounts requested at once')
+    asynchronous.add_argument('--threads', type = int, default = 8, help = 'threads of the sync extraction')
+    options = subparsers.add_parser('options', help = 'tlminer with type filters, a created_at window and a columns projection')
+    options.add_argument('--n', type = int, default = 10000)
+    check = subparsers.add_parser('check', help = 'checks of the extraction options, failing with an AssertionError')
+    check.add_argument('--n', type = int, default = 1000)
+    args = parser.parse_args()
+
+    if args.benchmark == 'clean':
+        bench_clean(args.n, ascii = args.ascii)
+    elif args.benchmark == 'flatten':
+        bench_flatten(args.n)
+    elif args.benchmark == 'rowstore':
+        bench_rowstore(args.n)
+    elif args.benchmark == 'rebuild':
+        bench_rebuild(args.n)
+    elif args.benchmark == 'postprocess':
+        bench_postprocess(args.n, args.workers, shard_size = args.shard_size, raw_cache = args.raw_cache,
+                          write = args.write)
+    elif args.benchmark == 'extraction':
+        bench_extraction(args.sizes, latency = args.latency, rate_limit = args.rate_limit)
+    elif args.benchmark == 'async':
+        bench_async(args.accounts, args.n, latency = args.latency, max_concurrency = args.max_concurrency,
+                    threads = args.threads)
+    elif args.benchmark == 'options':
+        bench_options(args.n)
+    elif args.benchmark == 'check':
+        run_checks(args.n)
@@ -1,472 +1,2841 @@
-# -------------------------------------------------------------------------------------------------------------------------------
-# List of dependecies to run the Timeline Extrator
-# -------------------------------------------------------------------------------------------------------------------------------
-
-import tweepy
-import json
-import pandas as pd
-import re
-import string
-
-# -------------------------------------------------------------------------------------------------------------------------------
-#   twextract module description
-# -------------------------------------------------------------------------------------------------------------------------------
-#   * Miner class (Parent class of "tlminer"): This class is used to extract and subdivide the user timeline into Tweet, Retweet,
-#                                           Reply, Quoted as dictionaries without subdictionaries *
-#   * tlminer class: Class to transform each list of dictionaries into dataframes *
-#   * Friend_search class: Class to extract friends/followees data from user into a dataframe *
-#
-#   !!Input
-#   We have to use as arguments:
-#       - username: Screen name of the user from we want to extract the timeline
-#       - max_length: Max number of tweets to request. These are extracted from lastest to earliest
-#       - path: Final path to save the csv
-#       - consumerKey: Consumer key provided by Twitter Dev API
-#       - consumerSecret: Consumer secret provided by Twitter Dev API
-#       - accessToken: Access token provided by Twitter Dev API
-#       - accessTokenSecret: Access token secret provided by Twitter Dev API
-#
-#   !!Output
-#   This class has no output, all final dataframes can be extracted as objects using "tlminer" class, by extract an object called 'data'
-#   Giver Metric: Proportion between the amount of likes give by participation in tweets
-#   Balanced Metric: Proportion between the amount of friends by amount of followers
-#
-#   Dependecies required: tweepy json pandas (Base operations) 
-#                         re string (For cleanText method)
-#
-#   About tweepy library:
-#       - This script was tested using version 4.4.0
-# -------------------------------------------------------------------------------------------------------------------------------
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-# Class to start mining tweets and keep output dictionaries at one level
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-class Miner():
-    # Init constructor
-    def __init__(self, username, max_length, path,
-                        consumerKey, consumerSecret,
-                        accessToken, accessTokenSecret):
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Tweepy API connection
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Save screename variable
-        self.screen_name = username
-        # Save max_length variable
-        self.max_length = max_length
-        # Authorize Access to the API using .OAuthHandler().
-        authenticate = tweepy.OAuthHandler(consumerKey, consumerSecret)
-        # Set the Access tokens.
-        authenticate.set_access_token(accessToken, accessTokenSecret)
-        # Create the API object while passing in the auth information.
-        self.api = tweepy.API(authenticate, wait_on_rate_limit = True)
-        # Filepath to write final csv
-        self.path = path
-
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Subsetting variables
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Columns fixes
-        self.in_user_cols = ['name','screen_name','followers_count',
-                            'friends_count','statuses_count','favourites_count']
-        self.in_entities_cols = ['hashtags','user_mentions']
-
-        # Keys for subsetting
-        # For basic tweets
-        self.tweets_keys = ['id','created_at','full_text','user','favorited','entities']
-        # For replies
-        self.replies_keys = self.tweets_keys.copy()
-        # For retweets
-        self.retweets_keys = self.tweets_keys.copy()
-        self.retweets_keys.append('retweeted_status')
-        # For quoted tweets
-        self.quotes_keys = self.tweets_keys.copy()
-        self.quotes_keys.append('quoted_status')
-
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Variable to rename columns
-        #--------------------------------------------------------------------------------------------------------------------------
-        self.dict_changer = {'user.name':'source_node.name','user.screen_name':'source_node.screen_name',
-        # For source Node
-        'user.followers_count':'source_node.followers_count','user.friends_count':'source_node.friends_count',
-        'user.statuses_count':'source_node.statuses_count','user.favourites_count':'source_node.favourites_count',
-        'favorited':'favorited_by_source', 'id':'tweet_id',
-        # For Target Node (Replies)
-        'in_reply_to_status.name':'target_node.name','in_reply_to_status.screen_name':'target_node.screen_name',
-        'in_reply_to_status.followers_count':'target_node.followers_count','in_reply_to_status.friends_count':'target_node.friends_count',
-        'in_reply_to_status.statuses_count':'target_node.statuses_count','in_reply_to_status.favourites_count':'target_node.favourites_count',
-        # For Target Node (Retweets)
-        'retweeted_status.user.name':'target_node.name','retweeted_status.user.screen_name':'target_node.screen_name',
-        'retweeted_status.user.followers_count':'target_node.followers_count','retweeted_status.user.friends_count':'target_node.friends_count',
-        'retweeted_status.user.statuses_count':'target_node.statuses_count','retweeted_status.user.favourites_count':'target_node.favourites_count',
-        # For Target Node (Quoted)
-        'quoted_status.user.name':'target_node.name','quoted_status.user.screen_name':'target_node.screen_name',
-        'quoted_status.user.followers_count':'target_node.followers_count','quoted_status.user.friends_count':'target_node.friends_count',
-        'quoted_status.user.statuses_count':'target_node.statuses_count','quoted_status.user.favourites_count':'target_node.favourites_count'
-        }
-
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Final step: extract DFs
-        #--------------------------------------------------------------------------------------------------------------------------
-         # Lists to allocate tweets, replied, retweets and quoted tweets
-        self.tweets = []
-        self.replies = []
-        self.retweets = []
-        self.quotes = []
-
-        # Columns fixes
-        in_user_cols = self.in_user_cols
-        in_entities_cols = self.in_entities_cols
-
-        # Keys for subsetting
-        tweets_keys = self.tweets_keys
-        replies_keys = self.replies_keys
-        retweets_keys = self.retweets_keys
-        quotes_keys = self.quotes_keys
-
-
-        # Get user timeline 
-        for tweet in tweepy.Cursor(method= self.api.user_timeline, screen_name= self.screen_name,
-                                    tweet_mode = "extended").items(self.max_length):
-
-            # Convert twitter status into a dictionary and validate if contains an extended version
-            try:
-                newtweet = jsonify_tweepy(tweet.extended_tweet)
-            except AttributeError:
-                newtweet = jsonify_tweepy(tweet)
-
-            # Subset quoted tweets
-            if 'quoted_status' in newtweet.keys():
-                # Create Empty dictionary
-                quoted_status = dict()
-                # Loop over quoted tweet keys
-                for key in quotes_keys:
-                        # Add quoted_status user info to dict
-                        if key == 'quoted_status':
-                            # Loop over quoted user info
-                            for i in in_user_cols:
-                                quoted_status['quoted_status.user.'+ i] = newtweet[key]['user'][i]
-                        # Add entities info to dict
-                        elif key == 'entities':
-                            # Loop over entities items
-                            for i in in_entities_cols:
-                                quoted_status['entities.'+ i] = newtweet[key][i]
-                        # Add source node info
-                        elif key == 'user':
-                            # Loop source user info
-                            for i in in_user_cols:
-                                quoted_status['user.'+ i] = newtweet[key][i]
-                        # Add any other key to dict
-                        else:
-                            # If we don't have an extended tweet, it will append the 'text' value
-                            if key == "full_text":
-                                try:
-                                    quoted_status[key] = newtweet[key]
-                                except:
-                                    quoted_status[key] = newtweet['text']
-                            else:
-                                quoted_status[key] = newtweet[key]                            
-                # Append new dictionary to quoted list
-                self.quotes.append(quoted_status) 
-
-
-            # Subset retweeted tweets
-            elif 'retweeted_status' in newtweet.keys():
-                # Create Empty dictionary
-                retweeted_status = dict()
-                # Loop over retweet keys
-                for key in retweets_keys:
-                        # Add retweeted_status user info to dict
-                        if key == 'retweeted_status':
-                            # Loop over retweeted user info
-                            for i in in_user_cols:
-                                retweeted_status['retweeted_status.user.'+ i] = newtweet[key]['user'][i]
-                        # Add entities info to dict
-                        elif key == 'entities':
-                            # Loop over entities items
-                            for i in in_entities_cols:
-                                retweeted_status['entities.'+ i] = newtweet[key][i] 
-                        # Add source node info
-                        elif key == 'user':
-                            # Loop source user info
-                            for i in in_user_cols:
-                                retweeted_status['user.'+ i] = newtweet[key][i]
-                        # Add any other key to dict
-                        else:
-                            # If we don't have an extended tweet, it will append the 'text' value
-                            if key == "full_text":
-                                try:
-                                    retweeted_status[key] = newtweet[key]
-                                except:
-                                    retweeted_status[key] = newtweet['text']
-                            else:
-                                retweeted_status[key] = newtweet[key]                       
-                # Append new dictionary to retweeted list
-                self.retweets.append(retweeted_status)
-
-            
-            # Subset replies
-            elif newtweet['in_reply_to_status_id'] != None:
-                # Create Empty dictionary
-                replied_status = dict()
-                # Return replied user info in a dictionary
-                replied_user_info = self.get_user_info(user_id = newtweet['in_reply_to_user_id_str'], kind='target_node')
-                # Loop over replied tweet keys
-                for key in replies_keys:
-                        # Add entities info to dict
-                        if key == 'entities':
-                            # Loop over entities items
-                            for i in in_entities_cols:
-                                replied_status['entities.'+ i] = newtweet[key][i]
-                        # Add source node info
-                        elif key == 'user':
-                            # Loop source user info
-                            for i in in_user_cols:
-                                replied_status['user.'+ i] = newtweet[key][i]
-                        # Add any other key to dict
-                        else:
-                            # If we don't have an extended tweet, it will append the 'text' value
-                            if key == "full_text":
-                                try:
-                                    replied_status[key] = newtweet[key]
-                                except:
-                                    replied_status[key] = newtweet['text']
-                            else:
-                                replied_status[key] = newtweet[key]
-                # Merge status dictionary with replies dictionary
-                replied_status = {**replied_status,**replied_user_info}
-                # Append new dictionary to replies list
-                self.replies.append(replied_status)
-
-
-            # Subset regular tweets
-            else:
-                # Create Empty dictionary
-                normal_status = dict()
-                # Loop over basic tweet keys
-                for key in tweets_keys:
-                        # Add entities info to dict
-                        if key == 'entities':
-                            # Loop over entities items
-                            for i in in_entities_cols:
-                                normal_status['entities.'+ i] = newtweet[key][i]
-                        # Add source node info
-                        elif key == 'user':
-                            # Loop source user info
-                            for i in in_user_cols:
-                                normal_status['user.'+ i] = newtweet[key][i]
-                        # Add any other key to dict
-                        else:
-                            # If we don't have an extended tweet, it will append the 'text' value
-                            if key == "full_text":
-                                try:
-                                    normal_status[key] = newtweet[key]
-                                except:
-                                    normal_status[key] = newtweet['text']
-                            else:
-                                normal_status[key] = newtweet[key]                    
-                # Append new dictionary to tweets list
-                self.tweets.append(normal_status)
-
-    #--------------------------------------------------------------------------------------------------------------------------
-    # Function to get info from users, in this case will be useful for replied users
-    #--------------------------------------------------------------------------------------------------------------------------
-    def get_user_info(self, user_id, kind):
-        # Create dictionary from tweepy oject 
-        user_dict = jsonify_tweepy(self.api.get_user(user_id = user_id))
-        # Create new comprehensive dictionary with required columns
-        user_dict = {kind+'.'+key : user_dict[key] for key in self.in_user_cols}
-        return user_dict
-
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-# Class to transform each list of dictionaries into dataframes
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-class tlminer(Miner):
-    def __init__(self, username, max_length, path,
-                        consumerKey, consumerSecret,
-                        accessToken, accessTokenSecret):
-        super().__init__(username, max_length, path,
-                        consumerKey, consumerSecret,
-                        accessToken, accessTokenSecret)
-
-
-        # Transform each list of dictionaries into dataframes
-        try:
-            # Individual transformations
-            tweetsDF = self.transformer(tweets_list = self.tweets, kind = 'Tweet')
-        except:
-            tweetsDF = pd.DataFrame()
-            print('No tweets')
-
-        try:
-            # Individual transformations
-            retweetsDF = self.transformer(tweets_list = self.retweets, kind = 'Retweet')
-        except:
-            retweetsDF = pd.DataFrame()
-            print('No retweets')
-
-        try:
-            # Individual transformations
-            quotedDF = self.transformer(tweets_list = self.quotes, kind = 'Quoted')
-        except:
-            quotedDF = pd.DataFrame()
-            print('No quoted tweets')
-
-        try:
-            # Individual transformations
-            repliesDF = self.transformer(tweets_list = self.replies, kind = 'Replied')
-        except:
-            repliesDF = pd.DataFrame()
-            print('No replied tweets')
-
-        # Final output -- MERGE all dataframes into one by equal columns
-        self.data  = pd.concat([tweetsDF, quotedDF, repliesDF, retweetsDF], axis = 0)
-        # Fix index repetition issue
-        self.data = self.data.reset_index().drop(columns=['index'])
-        # Create final column for Giver Metric
-        self.data['source_node.Giver'] = self.data['source_node.favourites_count'] / self.data['source_node.statuses_count']
-        self.data['target_node.Giver'] = self.data['target_node.favourites_count'] / self.data['target_node.statuses_count']
-        # Create final column for Balanced Metric
-        self.data['source_node.Balanced'] = self.data['source_node.friends_count'] / self.data['source_node.followers_count']
-        self.data['target_node.Balanced'] = self.data['target_node.friends_count'] / self.data['target_node.followers_count']
-        # Write final output in csv
-        self.data.to_csv(self.path)
-
-    #--------------------------------------------------------------------------------------------------------------------------
-    # Function to make last transformations on individual Dataframes 
-    #--------------------------------------------------------------------------------------------------------------------------
-    def transformer(self, tweets_list, kind):
-        # Transform into dataframe
-        df = pd.json_normalize(tweets_list)
-        # Rename columns (To source and target node)
-        df = df.rename(columns=self.dict_changer)
-        # Set label for type of tweet
-        df['type'] = [kind for i in range(df.shape[0])]
-        # Clean text label
-        df['full_text'] = df['full_text'].apply(cleanText)
-
-        return df
-
-
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-# Class to extract friends/followees data from user
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-class Friend_search():
-    # Init constructor
-    def __init__(self, username, max_length, path,
-                        consumerKey, consumerSecret,
-                        accessToken, accessTokenSecret):
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Tweepy API connection
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Authorize Access to the API using .OAuthHandler().
-        authenticate = tweepy.OAuthHandler(consumerKey, consumerSecret)
-        # Set the Access tokens.
-        authenticate.set_access_token(accessToken, accessTokenSecret)
-        # Create the API object while passing in the auth information.
-        self.api = tweepy.API(authenticate, wait_on_rate_limit = True) 
-
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Subsetting variables
-        #--------------------------------------------------------------------------------------------------------------------------
-        # Columns fixes
-        self.in_user_cols = ['id','name','screen_name','description','followers_count',
-                            'friends_count','statuses_count','favourites_count']
-
-        # Get collection of users information
-        # Empty list to allocate dictionaries with user objects
-        friend_list = [] 
-
-        # Loop pagination
-        for friend in tweepy.Cursor(method= self.api.get_friends, screen_name= username).items(max_length):
-            # Empty dict for individual user info
-            new_friend = dict()
-            # Filling new dict
-            for key in self.in_user_cols:
-                new_friend[key] = jsonify_tweepy(friend)[key]
-            
-            friend_list.append(new_friend)
-
-        
-        # Transform into dataframe
-        self.data = pd.json_normalize(friend_list)
-
-        # Clean descriptions
-        self.data.description = self.data.description.apply(cleanText)
-
-        # Create final column for Giver Metric
-        self.data['Giver'] = self.data.favourites_count / self.data.statuses_count
-
-        # Create final column for Balanced Metric
-        self.data['Balanced'] = self.data.friends_count / self.data.followers_count
-
-        # Write final output in csv
-        self.data.to_csv(path)
-
-
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-# Global Scope functions
-# -------------------------------------------------------------------------------------------------------------------------------
-# -------------------------------------------------------------------------------------------------------------------------------
-
-#--------------------------------------------------------------------------------------------------------------------------
-# Function to transform a 'tweepy.models.Status' object into a string and then into a Dictionary 
-#--------------------------------------------------------------------------------------------------------------------------
-def jsonify_tweepy(tweepy_object):
-    # Write : Transform the tweepy's json object and transform into a dictionary 
-    json_str = json.dumps(tweepy_object._json, indent = 2)
-    # Read : Transform the json into a Python Dictionary
-    finaljson = json.loads(json_str)
-    return finaljson
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# Twitter text cleaner, additional method
-# -------------------------------------------------------------------------------------------------------------------------------
-def cleanText(text):
-    # Remove @mentions
-    text = re.sub(r'@[A-Za-z0-9]+', '', text)
-    # Remove hashtags, just the numeral
-    text = re.sub(r'#', '', text)
-    # Remove tweets with Retweets followed by one or more whitespaces
-    text = re.sub(r'RT[\s]+', '', text)
-    # Get rid of an URL or hypelink
-    text = re.sub(r'https?://(www\.)?(\w+)(\.\w+)', '', text)
-    # Remove words with punctuations
-    text = re.sub(r'[%s]' % re.escape(string.punctuation), '', text)
-    text = re.sub(r'’', '', text)
-    # Remove words with numbers 
-    text = re.sub(r'\w*\d\w*', '', text)
-    # Remove emojis
-    text = deEmojify(text)
-    # Remove emails
-    text = re.sub(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+', '', text)
-    # Lowercase the text
-    text = text.lower()
-    return text
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# Emoji remover by @Abdul-Razak Adam https://stackoverflow.com/questions/33404752/removing-emojis-from-a-string-in-python
-# -------------------------------------------------------------------------------------------------------------------------------
-def deEmojify(text):
-    regrex_pattern = re.compile(pattern = "["
-        u"\U0001F600-\U0001F64F"  # emoticons
-        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-        u"\U0001F680-\U0001F6FF"  # transport & map symbols
-        u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                           "]+", flags = re.UNICODE)
-    return regrex_pattern.sub(r'',text)
-
-
-# -------------------------------------------------------------------------------------------------------------------------------
-# About script
-# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# List of dependecies to run the Timeline Extrator
+# -------------------------------------------------------------------------------------------------------------------------------
+
+import json
+import re
+import datetime
+import os
+import bisect
+import zlib
+import shutil
+import string
+import sys
+import time
+import itertools
+import array
+import operator
+import threading
+import concurrent.futures
+import multiprocessing
+import urllib.parse
+import contextlib
+import importlib
+from collections import OrderedDict
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Class of a module imported on first use: the first attribute read imports it and replaces the global name of this module
+# by the module itself, so later reads cost nothing. pandas, numpy, tweepy, requests and the modules only needed by some
+# features (RawCache, AsyncAPI, Metrics profiles) take most of the import time
+#--------------------------------------------------------------------------------------------------------------------------
+class LazyModule():
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+pd = LazyModule('pandas', 'pd')
+np = LazyModule('numpy', 'np')
+tweepy = LazyModule('tweepy', 'tweepy')
+requests = LazyModule('requests', 'requests')
+sqlite3 = LazyModule('sqlite3', 'sqlite3')
+asyncio = LazyModule('asyncio', 'asyncio')
+cProfile = LazyModule('cProfile', 'cProfile')
+pstats = LazyModule('pstats', 'pstats')
+tracemalloc = LazyModule('tracemalloc', 'tracemalloc')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+#   twextract module description
+# -------------------------------------------------------------------------------------------------------------------------------
+#   * Miner class (Parent class of "tlminer"): This class is used to extract and subdivide the user timeline into Tweet, Retweet,
+#                                           Reply, Quoted as flat rows, in the columns order of 'flat_specs' *
+#   * tlminer class: Class to transform each list of flat rows into dataframes *
+#   * Friend_search class: Class to extract friends/followees data from user into a dataframe *
+#   * Friend_crawler class: Breadth-first crawl of the friends graph (ego network of several hops) into edges and nodes *
+#   * ColumnStore class: Columnar accumulator of rows (typed arrays for numbers, interned names), used for the tweets lists *
+#   * Metrics class: Timers by stage, API calls by endpoint, rate limit waits, tweets/s and cache hits of an extraction *
+#   * UserCache class: Cache of user profiles (TTL + LRU) used to resolve replied users in bulk *
+#   * RateLimitScheduler class: Token buckets by credential set and endpoint, shared by concurrent workers *
+#   * batch_extract function: Extract many usernames concurrently with one or several credential sets *
+#   * postprocess function: Transform raw statuses into the tlminer dataset in shards over a process pool *
+#   * CheckpointStore class: State file with the highest tweet id by user, for incremental refreshes *
+#   * PageJournal class: Append-only jsonl journal synced to disk by entry, to resume interrupted extractions *
+#   * RawCache class: SQLite store of raw statuses/users/friends (compressed json by id), usable as API to rebuild offline *
+#   * cleanText_batch function: cleanText over a whole Series or list of texts in one pass *
+#   * CSVWriter, ParquetWriter, FeatherWriter classes: Output formats, Parquet/Feather with typed schemas and partitions *
+#   * ReplayAPI class: Local API that replays recorded or synthetic statuses/users, with latency and simulated 429s *
+#   * RecordingAPI class: Wrapper of a tweepy API that records its responses into a ReplayAPI fixture *
+#   * AsyncAPI class: asyncio client of the API (pooled connections), async_extract requests many users at once with it *
+#
+#   !!Input
+#   We have to use as arguments:
+#       - username: Screen name of the user from we want to extract the timeline
+#       - max_length: Max number of tweets to request. These are extracted from lastest to earliest
+#       - path: Final path to save the csv
+#       - consumerKey: Consumer key provided by Twitter Dev API
+#       - consumerSecret: Consumer secret provided by Twitter Dev API
+#       - accessToken: Access token provided by Twitter Dev API
+#       - accessTokenSecret: Access token secret provided by Twitter Dev API
+#   Optional arguments:
+#       - user_cache: UserCache object to share replied users lookups between miners (check hits/misses with .stats())
+#       - stream: If True, rows are not kept in memory. Miner.iter_rows() yields them page by page and tlminer appends
+#                 them to the csv by chunks of 'chunksize' rows ('data' is None, 'rows_written' has the total)
+#       - api: tweepy API object to use instead of creating one from the credentials, or a ReplayAPI to extract without
+#              Twitter credentials (they can be None)
+#       - scheduler: RateLimitScheduler object shared between workers, API calls wait on it instead of tweepy's sleep
+#       - writer: Output format, CSVWriter (default), ParquetWriter (e.g. partition_cols=['source_node.screen_name','date'])
+#                 or FeatherWriter. Parquet/Feather need pyarrow and follow 'timeline_schema'/'friends_schema' types
+#       - raw_cache: RawCache object where raw statuses and users are saved as they arrive (also in Friend_search, with
+#                    friends). Outputs can be rebuilt offline, without credentials, passing the same RawCache as 'api'
+#       - metrics: Metrics object (a new one by default, in 'metrics'), e.g. Metrics(progress=print, profile=True, memory=True)
+#                  to get a report every few seconds, a cProfile of the run and its peak traced memory. Check .report()
+#       - journal: Path of a jsonl journal where timeline pages and replied users are saved (fsync) as they arrive. A run that
+#                  dies is restarted with the same arguments and journal: saved pages are not requested again and the
+#                  timeline continues from the last max_id. The journal is removed once the output is written
+#       - checkpoint: CheckpointStore object, only tweets newer than the checkpoint are requested and merged into the
+#                     previous output at 'path' without duplicates (the checkpoint is saved after writing the output).
+#                     When max_length stops a run before the checkpoint is reached, the checkpoint keeps the tweets not
+#                     requested yet and the next run continues below the oldest tweet received, down to the checkpoint
+#       - include_rts, exclude_replies: Types of tweet left out (e.g. include_rts=False, exclude_replies=True for original
+#                                       tweets and quotes), as the pages arrive. Filtered tweets are not flattened, and
+#                                       replied users are not looked up without replies (the timeline pages are the same)
+#       - since, until: Window of created_at [since, until) as datetimes, dates or ISO 8601 strings (UTC unless they have an
+#                       offset). Only the tweet ids of the window are requested, the timeline stops once it passes 'since'
+#       - columns: Output columns (any of 'timeline_schema'), only the fields they need are flattened and replied users are
+#                  only looked up for 'target_node.' columns. The writer's partition_cols must be among them ('created_at'
+#                  for 'date'), otherwise a ValueError is raised before any request
+#       - run: If False, the constructor only prepares the object: no API object is created, nothing is requested or written.
+#              The steps are then called one by one, fetch() (also over a list of statuses, e.g. fetch(statuses) for
+#              offline work), transform() and write(), or all of them with run(). Also in Friend_search and Friend_crawler
+#
+#   !!Output
+#   This class has no output, all final dataframes can be extracted as objects using "tlminer" class, by extract an object called 'data'
+#   Giver Metric: Proportion between the amount of likes give by participation in tweets
+#   Balanced Metric: Proportion between the amount of friends by amount of followers
+#
+#   Dependecies required: tweepy json pandas (Base operations), imported on first use (see LazyModule)
+#                         re string (For cleanText method)
+#
+#   About tweepy library:
+#       - This script was tested using version 4.4.0
+# -------------------------------------------------------------------------------------------------------------------------------
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to start mining tweets and keep output dictionaries at one level
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class Miner():
+    # Init constructor
+    def __init__(self, username, max_length, path,
+                        consumerKey, consumerSecret,
+                        accessToken, accessTokenSecret,
+                        user_cache = None, stream = False,
+                        api = None, scheduler = None, checkpoint = None, journal = None, raw_cache = None,
+                        metrics = None, include_rts = True, exclude_replies = False, since = None, until = None,
+                        columns = None, run = True):
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Tweepy API connection
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Save screename variable
+        self.screen_name = username
+        # Save max_length variable
+        self.max_length = max_length
+        # Stream mode, rows are consumed with iter_rows()
+        self.stream = stream
+        # Shared rate limit scheduler (when None, rate limits are waited by call_api)
+        self.scheduler = scheduler
+        # API object shared between miners, otherwise it is created from the credentials on first use. Rate limits are not
+        # waited inside tweepy, so the waits are measured in 'metrics'
+        self._api = api
+        self.credentials = (consumerKey, consumerSecret, accessToken, accessTokenSecret)
+        # Filepath to write final csv
+        self.path = path
+        # Cache of user profiles (can be shared between miners to reuse lookups across timelines)
+        self.user_cache = user_cache if user_cache is not None else UserCache()
+        # Checkpoint store, only tweets newer than the last checkpoint are requested. A previous run stopped by max_length
+        # left the tweets in (since_id, max_id] to request, from below the oldest one it received
+        self.checkpoint = checkpoint
+        state = checkpoint.get_state(username) if checkpoint is not None else {}
+        self.since_id = self.checkpoint_id = state.get('since_id')
+        self.resume_id = state.get('max_id')
+        # Highest tweet id seen, saved as the next checkpoint once the timeline reaches the checkpoint
+        self.newest_id = state.get('newest_id', self.since_id)
+        # Next max_id of the timeline (below the oldest tweet received), and whether its end was reached
+        self.next_max_id = None
+        self.timeline_end = False
+        # Types of tweet left out (only the options that differ from the API defaults). Pages are requested unfiltered and
+        # filtered as they arrive: the API takes 'count' statuses before filtering, so a filtered page can be empty while
+        # older tweets remain, without an id to continue from
+        self.filters = {}
+        if not include_rts:
+            self.filters['include_rts'] = False
+        if exclude_replies:
+            self.filters['exclude_replies'] = True
+        # Window of created_at [since, until), requested as a range of tweet ids (their snowflake has the creation time).
+        # Tweets older than snowflakes are checked by created_at, and the timeline stops at the first one before 'since'
+        self.since = utc_datetime(since) if since is not None else None
+        self.until = utc_datetime(until) if until is not None else None
+        if self.since is not None and snowflake_id(self.since) is not None:
+            self.since_id = max(self.since_id or 0, snowflake_id(self.since) - 1)
+        self.max_id = snowflake_id(self.until) - 1 if self.until is not None and snowflake_id(self.until) is not None else None
+        if self.resume_id is not None:
+            self.max_id = min(self.max_id, self.resume_id) if self.max_id is not None else self.resume_id
+        # Journal of the pages and users received, to resume an interrupted extraction
+        self.journal = PageJournal(journal) if journal is not None else None
+        # Store of raw responses, to rebuild outputs offline
+        self.raw_cache = raw_cache
+        # Timers and counters of the extraction (can be shared between miners)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.user_cache = self.user_cache
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Subsetting variables
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Columns fixes
+        self.in_user_cols = ['name','screen_name','followers_count',
+                            'friends_count','statuses_count','favourites_count']
+        self.in_entities_cols = ['hashtags','user_mentions']
+
+        # Keys for subsetting
+        # For basic tweets
+        self.tweets_keys = ['id','created_at','full_text','user','favorited','entities']
+        # For replies
+        self.replies_keys = self.tweets_keys.copy()
+        # For retweets
+        self.retweets_keys = self.tweets_keys.copy()
+        self.retweets_keys.append('retweeted_status')
+        # For quoted tweets
+        self.quotes_keys = self.tweets_keys.copy()
+        self.quotes_keys.append('quoted_status')
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Variable to rename columns
+        #--------------------------------------------------------------------------------------------------------------------------
+        self.dict_changer = {'user.name':'source_node.name','user.screen_name':'source_node.screen_name',
+        # For source Node
+        'user.followers_count':'source_node.followers_count','user.friends_count':'source_node.friends_count',
+        'user.statuses_count':'source_node.statuses_count','user.favourites_count':'source_node.favourites_count',
+        'favorited':'favorited_by_source', 'id':'tweet_id',
+        # For Target Node (Replies)
+        'in_reply_to_status.name':'target_node.name','in_reply_to_status.screen_name':'target_node.screen_name',
+        'in_reply_to_status.followers_count':'target_node.followers_count','in_reply_to_status.friends_count':'target_node.friends_count',
+        'in_reply_to_status.statuses_count':'target_node.statuses_count','in_reply_to_status.favourites_count':'target_node.favourites_count',
+        # For Target Node (Retweets)
+        'retweeted_status.user.name':'target_node.name','retweeted_status.user.screen_name':'target_node.screen_name',
+        'retweeted_status.user.followers_count':'target_node.followers_count','retweeted_status.user.friends_count':'target_node.friends_count',
+        'retweeted_status.user.statuses_count':'target_node.statuses_count','retweeted_status.user.favourites_count':'target_node.favourites_count',
+        # For Target Node (Quoted)
+        'quoted_status.user.name':'target_node.name','quoted_status.user.screen_name':'target_node.screen_name',
+        'quoted_status.user.followers_count':'target_node.followers_count','quoted_status.user.friends_count':'target_node.friends_count',
+        'quoted_status.user.statuses_count':'target_node.statuses_count','quoted_status.user.favourites_count':'target_node.favourites_count'
+        }
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Columns of the output (all of them by default). Only the fields they need are flattened, replied users are not
+        # looked up without 'target_node.' columns and texts are not cleaned without 'full_text'
+        #--------------------------------------------------------------------------------------------------------------------------
+        all_cols = [name for name, _ in timeline_schema]
+        if columns is not None:
+            unknown = [column for column in columns if column not in all_cols]
+            if unknown:
+                raise ValueError('Unknown columns %s, the columns are: %s' % (unknown, all_cols))
+            columns = [column for column in all_cols if column in columns]
+        self.output_cols = columns
+        self.schema = [(name, kind) for name, kind in timeline_schema if columns is None or name in columns]
+        selected = set(columns if columns is not None else all_cols)
+        # Fields of the Giver and Balanced metrics, and type label (kept to sort the rows)
+        for prefix in ['source_node.', 'target_node.']:
+            if prefix + 'Giver' in selected:
+                selected.update([prefix + 'favourites_count', prefix + 'statuses_count'])
+            if prefix + 'Balanced' in selected:
+                selected.update([prefix + 'friends_count', prefix + 'followers_count'])
+        selected.add('type')
+        # Columns of the replied users
+        self.target_user_cols = [i for i in self.in_user_cols if 'target_node.' + i in selected]
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Flattening specs by type of tweet, as (final columns, field paths), computed once from the keys and dict_changer
+        #--------------------------------------------------------------------------------------------------------------------------
+        self.flat_specs = {}
+        for kind, keys in [('Tweet', self.tweets_keys), ('Replied', self.replies_keys),
+                           ('Retweet', self.retweets_keys), ('Quoted', self.quotes_keys)]:
+            kind_cols, spec = build_flat_spec(keys, self.in_user_cols, self.in_entities_cols, self.dict_changer,
+                                              select = selected)
+            # Replied users are appended from the users cache
+            if kind == 'Replied':
+                kind_cols += ['target_node.'+ i for i in self.target_user_cols]
+            self.flat_specs[kind] = (kind_cols + ['type'], spec)
+
+        # Final columns, fixed order used when rows are written by chunks
+        self.data_cols = self.flat_specs['Tweet'][0] + ['target_node.'+ i for i in self.target_user_cols]
+        # Columns with few distinct strings, kept once in memory
+        interned_cols = [node + i for node in ['source_node.', 'target_node.'] for i in ['name', 'screen_name']] + ['type']
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Final step: extract DFs
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Column stores to allocate tweets, replied, retweets and quoted tweets
+        self.tweets = ColumnStore(self.flat_specs['Tweet'][0], types = dict(timeline_schema), intern = interned_cols)
+        self.replies = ColumnStore(self.flat_specs['Replied'][0], types = dict(timeline_schema), intern = interned_cols)
+        self.retweets = ColumnStore(self.flat_specs['Retweet'][0], types = dict(timeline_schema), intern = interned_cols)
+        self.quotes = ColumnStore(self.flat_specs['Quoted'][0], types = dict(timeline_schema), intern = interned_cols)
+
+        # Nothing is requested until run() (or fetch()) is called
+        if run:
+            self.run()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # API object, created from the credentials on first use
+    #--------------------------------------------------------------------------------------------------------------------------
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = build_api(*self.credentials, wait_on_rate_limit = False)
+        return self._api
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to run the extraction. In stream mode nothing is kept in memory, rows are consumed with iter_rows()
+    #--------------------------------------------------------------------------------------------------------------------------
+    def run(self):
+        if not self.stream:
+            self.fetch()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to fill the tweets, replies, retweets and quoted lists, from the timeline or from a list of status dictionaries
+    # (e.g. read from a RawCache, replied users are still resolved through the users cache and the API)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def fetch(self, statuses = None):
+        self.metrics.start(self)
+        # Lists by type of tweet
+        subsets = {'Tweet': self.tweets, 'Retweet': self.retweets, 'Quoted': self.quotes, 'Replied': self.replies}
+        try:
+            for kind, status in self.iter_subsets(None if statuses is None else [statuses]):
+                subsets[kind].append(status)
+        except BaseException:
+            # A failed extraction stops its metrics, so a shared Metrics still finishes with the other miners
+            self.metrics.stop(self)
+            raise
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Generator of (type, list of values) for each tweet, requested page by page
+    #--------------------------------------------------------------------------------------------------------------------------
+    def iter_subsets(self, pages = None):
+        for subsets in self.iter_page_subsets(pages):
+            yield from subsets
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Generator of lists of (type, list of values), one list by timeline page (or by list of statuses in 'pages')
+    #--------------------------------------------------------------------------------------------------------------------------
+    def iter_page_subsets(self, pages = None):
+        # Get user timeline page by page, so reply targets can be resolved in bulk before subsetting
+        for newtweets in (pages if pages is not None else self.iter_pages()):
+            # Resolve all replied users of the page with bulk requests
+            if self.target_user_cols:
+                with self.metrics.timer('resolve_users'):
+                    self.resolve_users([newtweet['in_reply_to_user_id_str'] for newtweet in newtweets
+                                        if tweet_kind(newtweet) == 'Replied'])
+
+            # Subset each tweet
+            with self.metrics.timer('flatten'):
+                subsets = [self.subset_tweet(newtweet) for newtweet in newtweets]
+            yield subsets
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Generator of timeline pages (lists of status dictionaries), within max_length. Pages saved in the journal by a previous
+    # run are replayed first, then pages are requested from the last max_id and saved to the journal as they arrive
+    #--------------------------------------------------------------------------------------------------------------------------
+    def iter_pages(self):
+        remaining = self.max_length or None
+        max_id = self.max_id
+        journal_pages, finished = self.read_journal()
+        while remaining is None or remaining > 0:
+            newtweets = next(journal_pages, None)
+            if newtweets is None:
+                if finished:
+                    break
+                # Request the next page, older than the last tweet received
+                page = self.call('user_timeline', screen_name = self.screen_name, tweet_mode = "extended",
+                                 count = min(remaining or 200, 200), max_id = max_id, since_id = self.since_id)
+                if len(page) == 0:
+                    self.write_journal({'end': True})
+                    finished = True
+                    break
+                # Read twitter statuses as dictionaries (they are not modified, so not copied)
+                newtweets = [tweepy_json(tweet) for tweet in page]
+                # The next page is older than the last tweet received, even when it is filtered out or out of the window
+                max_id = min(tweet['id'] for tweet in newtweets) - 1
+                # The window is checked on the whole page, its start can be passed by tweets filtered out
+                if self.since is not None or self.until is not None:
+                    newtweets, finished = self.select_window(newtweets)
+                newtweets = filter_timeline(newtweets, **self.filters)
+                # Within the requested max_length
+                newtweets = newtweets[:remaining]
+                with self.metrics.timer('save'):
+                    if newtweets:
+                        self.write_journal({'page': newtweets})
+                    if finished:
+                        self.write_journal({'end': True})
+                    if self.raw_cache is not None:
+                        self.raw_cache.add_statuses(self.screen_name, newtweets)
+                if not newtweets:
+                    continue
+            else:
+                max_id = min(tweet['id'] for tweet in newtweets) - 1
+            self.newest_id = max(self.newest_id or 0, max(tweet['id'] for tweet in newtweets))
+            self.metrics.add_tweets(len(newtweets))
+            yield newtweets
+
+            # Count requested tweets against max_length
+            if remaining is not None:
+                remaining -= len(newtweets)
+        # Where a next run continues when max_length stopped this one (see save_checkpoint)
+        self.next_max_id = max_id
+        self.timeline_end = finished
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to keep the statuses of a page created in the window [since, until), returns (statuses, start of the window
+    # passed). Pages go from the newest to the oldest tweet, so no later page is in the window once its start is passed
+    #--------------------------------------------------------------------------------------------------------------------------
+    def select_window(self, statuses):
+        times = [status_time(status) for status in statuses]
+        selected = [status for status, created in zip(statuses, times)
+                    if (self.since is None or created >= self.since) and (self.until is None or created < self.until)]
+        return selected, self.since is not None and bool(times) and min(times) < self.since
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to read the journal of a previous run: users go to the cache, returns (iterator of pages, end of timeline reached)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def read_journal(self):
+        pages = []
+        finished = False
+        header = {'screen_name': self.screen_name.lower(), 'since_id': self.since_id, 'max_length': self.max_length}
+        # Filters and window, when given
+        header.update(self.filters)
+        header.update({key: moment.isoformat() for key, moment in [('since', self.since), ('until', self.until)]
+                       if moment is not None})
+        entries = self.journal.entries() if self.journal is not None else []
+        for entry in entries:
+            if 'screen_name' in entry and entry != header:
+                raise ValueError('Journal %s belongs to another extraction: %s' % (self.journal.path, entry))
+            for user_dict in entry.get('users', []):
+                self.user_cache.set(user_dict['id_str'], user_dict)
+            if 'page' in entry:
+                pages.append(entry['page'])
+            finished = finished or entry.get('end', False)
+        if self.journal is not None and not entries:
+            self.journal.append(header)
+        return iter(pages), finished
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to save an entry in the journal (when there is one)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write_journal(self, entry):
+        if self.journal is not None:
+            self.journal.append(entry)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Generator of final rows (renamed columns, type label and clean text), as each timeline page arrives
+    #--------------------------------------------------------------------------------------------------------------------------
+    def iter_rows(self):
+        self.metrics.start(self)
+        try:
+            for subsets in self.iter_page_subsets():
+                # Columns are already renamed (To source and target node) and labeled by the flattener
+                rows = [dict(zip(self.flat_specs[kind][0], values)) for kind, values in subsets]
+                # Clean text label, the whole page at once
+                if 'full_text' in self.data_cols:
+                    with self.metrics.timer('clean'):
+                        for row, text in zip(rows, cleanText_batch([row['full_text'] for row in rows])):
+                            row['full_text'] = text
+                yield from rows
+        except BaseException:
+            # Same as fetch(), the metrics of a failed extraction are stopped
+            self.metrics.stop(self)
+            raise
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to flatten a tweet dictionary in a single pass, returns (type, list of values in flat_specs[type] columns order)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def subset_tweet(self, newtweet):
+        kind = tweet_kind(newtweet)
+        values = flatten_status(newtweet, self.flat_specs[kind][1])
+        # Add replied user info
+        if kind == 'Replied' and self.target_user_cols:
+            values += self.get_user_info(user_id = newtweet['in_reply_to_user_id_str'], kind='target_node').values()
+        # Set label for type of tweet
+        values.append(kind)
+        return kind, values
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to get info from users, in this case will be useful for replied users
+    #--------------------------------------------------------------------------------------------------------------------------
+    def get_user_info(self, user_id, kind):
+        # Look for the user in cache, it should be there after resolve_users
+        user_dict = self.user_cache.peek(user_id)
+        if user_dict is None:
+            # Read dictionary from tweepy oject 
+            user_dict = tweepy_json(self.call('get_user', user_id = user_id))
+            self.user_cache.set(user_id, user_dict)
+            with self.metrics.timer('save'):
+                self.save_users([user_dict])
+        # Create new comprehensive dictionary with required columns
+        user_dict = {kind+'.'+key : user_dict[key] for key in self.target_user_cols}
+        return user_dict
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to resolve a group of users through the cache, missing ones are requested in batches of 100 ids
+    #--------------------------------------------------------------------------------------------------------------------------
+    def resolve_users(self, user_ids):
+        hydrate_users(self.api, user_ids, self.user_cache, scheduler = self.scheduler, on_lookup = self.save_users,
+                      metrics = self.metrics)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to save requested users in the journal (so a resumed run finds them in cache) and in the raw cache
+    #--------------------------------------------------------------------------------------------------------------------------
+    def save_users(self, users):
+        with self.metrics.timer('save'):
+            self.write_journal({'users': users})
+            if self.raw_cache is not None:
+                self.raw_cache.add_users(users)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to save the highest tweet id seen, call it once the output is written. When max_length stopped the timeline
+    # before the previous checkpoint, the checkpoint stays and the next run continues below the oldest tweet received
+    #--------------------------------------------------------------------------------------------------------------------------
+    def save_checkpoint(self):
+        if self.checkpoint is None or self.newest_id is None:
+            return
+        if self.timeline_end or self.checkpoint_id is None or self.next_max_id is None:
+            self.checkpoint.set(self.screen_name, self.newest_id)
+        else:
+            self.checkpoint.set(self.screen_name, self.checkpoint_id, max_id = self.next_max_id, newest_id = self.newest_id)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to close an extraction once its output is written: the checkpoint is saved, the journal removed and the
+    # metrics stopped
+    #--------------------------------------------------------------------------------------------------------------------------
+    def complete(self):
+        self.save_checkpoint()
+        if self.journal is not None:
+            self.journal.clear()
+        self.metrics.stop(self)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to request an API endpoint through the rate limit scheduler
+    #--------------------------------------------------------------------------------------------------------------------------
+    def call(self, endpoint, **kwargs):
+        return call_api(self.api, endpoint, scheduler = self.scheduler, metrics = self.metrics, **kwargs)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to transform each list of dictionaries into dataframes
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class tlminer(Miner):
+    def __init__(self, username, max_length, path,
+                        consumerKey, consumerSecret,
+                        accessToken, accessTokenSecret,
+                        user_cache = None, stream = False, chunksize = 1000,
+                        api = None, scheduler = None, checkpoint = None, writer = None, journal = None,
+                        raw_cache = None, metrics = None, include_rts = True, exclude_replies = False, since = None,
+                        until = None, columns = None, run = True):
+        super().__init__(username, max_length, path,
+                        consumerKey, consumerSecret,
+                        accessToken, accessTokenSecret,
+                        user_cache = user_cache, stream = stream,
+                        api = api, scheduler = scheduler, checkpoint = checkpoint, journal = journal,
+                        raw_cache = raw_cache, metrics = metrics, include_rts = include_rts,
+                        exclude_replies = exclude_replies, since = since, until = until, columns = columns, run = False)
+        # Output format (csv by default)
+        self.writer = writer if writer is not None else CSVWriter()
+        # Partition columns must be in the projection ('date' is taken from created_at), checked before any request
+        if self.output_cols is not None:
+            needed = ['created_at' if column == 'date' else column for column in getattr(self.writer, 'partition_cols', None) or []]
+            missing = [column for column in needed if column not in self.output_cols]
+            if missing:
+                raise ValueError('The writer partitions by columns left out of the projection, add them to columns: %s' % missing)
+        # Rows by chunk in stream mode
+        self.chunksize = chunksize
+        # Final dataframe, built by transform()
+        self.data = None
+
+        # Extract, transform and write, unless the steps are called one by one
+        if run:
+            self.run()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to run the whole extraction: fetch(), transform() and write(), or write_stream() in stream mode
+    #--------------------------------------------------------------------------------------------------------------------------
+    def run(self):
+        try:
+            if self.stream:
+                self.write_stream()
+            else:
+                self.fetch()
+                self.transform()
+                self.write()
+        finally:
+            # complete() stops the metrics of a run that writes its output, this stops them when a step fails
+            self.metrics.stop(self)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to check if new rows are merged with the previous output (only with checkpoints)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def merging(self):
+        return self.checkpoint is not None and os.path.exists(self.path)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function of the stream mode: rows are written by chunks as each timeline page arrives, nothing is kept in memory
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write_stream(self):
+        merge = self.merging()
+        frames = frame_chunks(self.iter_rows(), columns = self.data_cols, chunksize = self.chunksize,
+                              prefixes = ['source_node.','target_node.'], metrics = self.metrics)
+        if self.output_cols is not None:
+            frames = (df.reindex(columns = self.output_cols) for df in frames)
+        # When merging, new rows go first and the previous output is appended after them, in a new output that
+        # replaces the previous one at the end
+        if merge:
+            frames = merge_chunks(frames, self.writer.read_chunks(self.path, chunksize = self.chunksize))
+        new_path = self.path + '.new' if merge else self.path
+        # Time of the writer only, rows are produced (and timed by stage) while the chunks are written
+        try:
+            with self.metrics.timer('write'):
+                self.rows_written = self.writer.write_chunks(frames, new_path, schema = self.schema)
+        except BaseException:
+            # The previous output is kept as it was
+            if merge:
+                remove_output(new_path)
+            raise
+        if merge:
+            replace_output(new_path, self.path)
+        self.complete()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to transform the lists filled by fetch() into the final dataframe 'data'
+    #--------------------------------------------------------------------------------------------------------------------------
+    def transform(self):
+        # Transform each list of flat tweets into dataframes
+        if self.tweets:
+            # Individual transformations
+            tweetsDF = self.transformer(tweets_list = self.tweets, kind = 'Tweet')
+        else:
+            tweetsDF = pd.DataFrame()
+            print('No tweets')
+
+        if self.retweets:
+            # Individual transformations
+            retweetsDF = self.transformer(tweets_list = self.retweets, kind = 'Retweet')
+        else:
+            retweetsDF = pd.DataFrame()
+            print('No retweets')
+
+        if self.quotes:
+            # Individual transformations
+            quotedDF = self.transformer(tweets_list = self.quotes, kind = 'Quoted')
+        else:
+            quotedDF = pd.DataFrame()
+            print('No quoted tweets')
+
+        if self.replies:
+            # Individual transformations
+            repliesDF = self.transformer(tweets_list = self.replies, kind = 'Replied')
+        else:
+            repliesDF = pd.DataFrame()
+            print('No replied tweets')
+
+        # Final output -- MERGE all dataframes into one by equal columns
+        with self.metrics.timer('frames'):
+            self.data  = pd.concat([tweetsDF, quotedDF, repliesDF, retweetsDF], axis = 0)
+            # Fix index repetition issue
+            self.data = self.data.reset_index().drop(columns=['index'])
+            # Columns of an empty timeline
+            if self.data.empty:
+                self.data = self.data.reindex(columns = self.data_cols)
+        # Create final columns for Giver and Balanced Metrics
+        with self.metrics.timer('frames'):
+            add_metrics(self.data, prefixes = ['source_node.','target_node.'])
+            if self.output_cols is not None:
+                self.data = self.data.reindex(columns = self.output_cols)
+        return self.data
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write 'data' to 'path'. With checkpoints, the previous output is merged after the new rows, without
+    # repeating tweets (also in 'data')
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write(self):
+        # Merge with previous output, without repeating tweets
+        if self.merging():
+            with self.metrics.timer('merge'):
+                previous = self.writer.read(self.path).reindex(columns = self.data.columns)
+                if 'tweet_id' in previous:
+                    previous = previous[~previous['tweet_id'].isin(self.data['tweet_id'])]
+                self.data = pd.concat([self.data, previous] if len(self.data) else [previous], axis = 0).reset_index(drop = True)
+        # Write final output
+        with self.metrics.timer('write'):
+            self.writer.write(self.data, self.path, schema = self.schema)
+        self.complete()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to make last transformations on individual Dataframes 
+    #--------------------------------------------------------------------------------------------------------------------------
+    def transformer(self, tweets_list, kind):
+        # Transform into dataframe, columns are already renamed (To source and target node) and labeled by type of tweet
+        with self.metrics.timer('frames'):
+            if isinstance(tweets_list, ColumnStore):
+                df = tweets_list.to_frame()
+            else:
+                df = pd.DataFrame.from_records(tweets_list, columns = self.flat_specs[kind][0])
+        # Clean text label
+        if 'full_text' in df:
+            with self.metrics.timer('clean'):
+                df['full_text'] = cleanText_batch(df['full_text'])
+
+        return df
+
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to extract friends/followees data from user
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class Friend_search():
+    # Init constructor
+    def __init__(self, username, max_length, path,
+                        consumerKey, consumerSecret,
+                        accessToken, accessTokenSecret,
+                        api = None, scheduler = None, writer = None, raw_cache = None, run = True):
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Tweepy API connection
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Shared rate limit scheduler (when None, tweepy waits on rate limits by itself)
+        self.scheduler = scheduler
+        # Output format (csv by default)
+        self.writer = writer if writer is not None else CSVWriter()
+        # Store of raw responses, to rebuild the output offline
+        self.raw_cache = raw_cache
+        # API object shared between searches, otherwise it is created from the credentials on first use
+        self._api = api
+        self.credentials = (consumerKey, consumerSecret, accessToken, accessTokenSecret)
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Subsetting variables
+        #--------------------------------------------------------------------------------------------------------------------------
+        self.screen_name = username
+        self.max_length = max_length
+        self.path = path
+        # Columns fixes
+        self.in_user_cols = ['id','name','screen_name','description','followers_count',
+                            'friends_count','statuses_count','favourites_count']
+        # Friends as dictionaries of the 'in_user_cols' columns (filled by fetch()) and final dataframe (by transform())
+        self.friend_list = []
+        self.data = None
+
+        # Extract, transform and write, unless the steps are called one by one
+        if run:
+            self.run()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # API object, created from the credentials on first use
+    #--------------------------------------------------------------------------------------------------------------------------
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = build_api(*self.credentials, wait_on_rate_limit = self.scheduler is None)
+        return self._api
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to run the whole search: fetch(), transform() and write()
+    #--------------------------------------------------------------------------------------------------------------------------
+    def run(self):
+        self.fetch()
+        self.transform()
+        self.write()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to request the friends of the user, 200 by page up to max_length
+    #--------------------------------------------------------------------------------------------------------------------------
+    def fetch(self):
+        # Get collection of users information
+        friend_ids = []
+
+        # Loop pagination (200 friends per page)
+        remaining = self.max_length or None
+        cursor = -1
+        while cursor != 0 and (remaining is None or remaining > 0):
+            friends, (_, cursor) = call_api(self.api, 'get_friends', scheduler = self.scheduler, screen_name = self.screen_name,
+                                            cursor = cursor, count = 200)
+            # Read the user objects once, as dictionaries
+            friends = [tweepy_json(friend) for friend in friends[:remaining]]
+            for friend_json in friends:
+                # New dict for individual user info
+                new_friend = {key : friend_json[key] for key in self.in_user_cols}
+                self.friend_list.append(new_friend)
+            if self.raw_cache is not None:
+                self.raw_cache.add_users(friends)
+                friend_ids.extend(friend_json['id'] for friend_json in friends)
+            # Count requested friends against max_length
+            if remaining is not None:
+                remaining -= len(friends)
+        # Friends list of the user, in the order received
+        if self.raw_cache is not None:
+            self.raw_cache.set_friends(self.screen_name, friend_ids)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to transform the friends into the final dataframe 'data'
+    #--------------------------------------------------------------------------------------------------------------------------
+    def transform(self):
+        # Transform into dataframe
+        self.data = pd.json_normalize(self.friend_list)
+
+        # Clean descriptions
+        self.data.description = cleanText_batch(self.data.description)
+
+        # Create final columns for Giver and Balanced Metrics
+        add_metrics(self.data)
+        return self.data
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write 'data' to 'path'
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write(self):
+        self.writer.write(self.data, self.path, schema = friends_schema)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to crawl the friends graph breadth-first from a user, up to 'depth' hops. Friends are requested as ids (5000 per page)
+# for all nodes of a hop in parallel, and nodes are hydrated in bulk through a users cache once the crawl is done.
+#   !!Output
+#       - path: Edge list (source, target user ids), in 'edges'
+#       - nodes_path: Node table (friends columns, hop 'depth' and Giver/Balanced metrics), in 'nodes'
+#   Optional arguments:
+#       - max_length: Max number of friends requested by node (None for all of them)
+#       - journal: Path of a jsonl file with the friend ids of each expanded node. An interrupted crawl with the same journal
+#                  and arguments resumes from the nodes not expanded yet (another root, depth or max_length raises a
+#                  ValueError). Friends of protected or missing users are recorded as empty. It is removed once written
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class Friend_crawler():
+    # Init constructor
+    def __init__(self, username, depth, path,
+                        consumerKey, consumerSecret,
+                        accessToken, accessTokenSecret,
+                        nodes_path = None, max_length = None, journal = None, max_workers = 8,
+                        api = None, scheduler = None, user_cache = None, writer = None, run = True):
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Tweepy API connection
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Shared rate limit scheduler (when None, tweepy waits on rate limits by itself)
+        self.scheduler = scheduler
+        # Output format (csv by default)
+        self.writer = writer if writer is not None else CSVWriter()
+        # API object shared between crawlers, otherwise it is created from the credentials on first use
+        self._api = api
+        self.credentials = (consumerKey, consumerSecret, accessToken, accessTokenSecret)
+        # Users cache, sized for large frontiers unless one is shared between crawlers
+        self.user_cache = user_cache if user_cache is not None else UserCache(maxsize = 1000000)
+
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Crawl variables
+        #--------------------------------------------------------------------------------------------------------------------------
+        # Columns fixes
+        self.in_user_cols = ['id','name','screen_name','description','followers_count',
+                            'friends_count','statuses_count','favourites_count']
+        self.screen_name = username
+        self.depth = depth
+        self.max_length = max_length
+        self.journal = journal
+        self.max_workers = max_workers
+        # Outputs (nodes next to the edges by default, e.g. 'graph.csv' and 'graph_nodes.csv')
+        self.path = path
+        if nodes_path is None:
+            root, extension = os.path.splitext(path)
+            nodes_path = root + '_nodes' + extension
+        self.nodes_path = nodes_path
+        # Hop of each node (user id) from the root, nodes are deduplicated across the frontier by this dictionary
+        self.depths = {}
+        # Edge list as (source, target) user ids
+        self.edge_list = []
+        # Expanded nodes
+        self.expanded = set()
+        # Hydrated nodes as dictionaries of the 'in_user_cols' columns and their depth
+        self.node_list = []
+        # Final dataframes, built by transform()
+        self.edges = None
+        self.nodes = None
+
+        # Crawl, transform and write, unless the steps are called one by one
+        if run:
+            self.run()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # API object, created from the credentials on first use
+    #--------------------------------------------------------------------------------------------------------------------------
+    @property
+    def api(self):
+        if self._api is None:
+            self._api = build_api(*self.credentials, wait_on_rate_limit = self.scheduler is None)
+        return self._api
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to run the whole crawl: fetch(), transform() and write()
+    #--------------------------------------------------------------------------------------------------------------------------
+    def run(self):
+        self.fetch()
+        self.transform()
+        self.write()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to crawl the graph hop by hop and hydrate its nodes
+    #--------------------------------------------------------------------------------------------------------------------------
+    def fetch(self):
+        # Resume from the journal, or start from the root user
+        journal = PageJournal(self.journal) if self.journal is not None else None
+        self.read_journal(journal)
+        if not self.depths:
+            root = tweepy_json(call_api(self.api, 'get_user', scheduler = self.scheduler, screen_name = self.screen_name))
+            self.depths[root['id']] = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            try:
+                # Expand hop by hop the nodes not expanded yet, in the order they were found
+                for hop in range(self.depth):
+                    frontier = [node for node, node_depth in self.depths.items()
+                                if node_depth == hop and node not in self.expanded]
+                    for source, targets in zip(frontier, executor.map(self.friend_ids, frontier)):
+                        self.add_friends(source, targets)
+                        if journal is not None:
+                            journal.append({'source': source, 'targets': targets})
+            finally:
+                if journal is not None:
+                    journal.close()
+
+            # Hydrate all nodes in bulk, batches of 100 ids requested in parallel
+            nodes = list(self.depths)
+            for users in executor.map(lambda batch: hydrate_users(self.api, batch, self.user_cache, scheduler = self.scheduler),
+                                      [nodes[i:i+100] for i in range(0, len(nodes), 100)]):
+                for user_dict in users.values():
+                    new_node = {key : user_dict[key] for key in self.in_user_cols}
+                    new_node['depth'] = self.depths[user_dict['id']]
+                    self.node_list.append(new_node)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to transform the crawl into the 'edges' and 'nodes' dataframes
+    #--------------------------------------------------------------------------------------------------------------------------
+    def transform(self):
+        # Transform into dataframes
+        self.edges = pd.DataFrame(self.edge_list, columns = ['source', 'target'])
+        self.nodes = pd.DataFrame.from_records(self.node_list, columns = self.in_user_cols + ['depth'])
+
+        # Clean descriptions
+        self.nodes.description = cleanText_batch(self.nodes.description)
+
+        # Create final columns for Giver and Balanced Metrics
+        add_metrics(self.nodes)
+        return self.edges, self.nodes
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write 'edges' to 'path' and 'nodes' to 'nodes_path'
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write(self):
+        self.writer.write(self.edges, self.path, schema = edges_schema)
+        self.writer.write(self.nodes, self.nodes_path, schema = nodes_schema)
+        # The crawl is complete once written
+        if self.journal is not None:
+            PageJournal(self.journal).clear()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to replay the journal of a previous crawl, which must have the same root, depth and max_length (its header)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def read_journal(self, journal):
+        header = {'root': self.screen_name.lower(), 'depth': self.depth, 'max_length': self.max_length}
+        entries = journal.entries() if journal is not None else []
+        for entry in entries:
+            if 'root' in entry:
+                if entry != header:
+                    raise ValueError('Journal %s belongs to another crawl: %s' % (journal.path, entry))
+                continue
+            self.add_friends(entry['source'], entry['targets'])
+        if journal is not None and not entries:
+            journal.append(header)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to request the friend ids of a node, page by page (5000 ids per page) up to max_length
+    #--------------------------------------------------------------------------------------------------------------------------
+    def friend_ids(self, user_id):
+        ids = []
+        cursor = -1
+        while cursor != 0 and (self.max_length is None or len(ids) < self.max_length):
+            try:
+                page, (_, cursor) = call_api(self.api, 'get_friend_ids', scheduler = self.scheduler, user_id = user_id,
+                                             cursor = cursor, count = 5000)
+            except (tweepy.Unauthorized, tweepy.NotFound):
+                # Protected or missing user, the node is kept without friends
+                break
+            ids.extend(page)
+        return ids[:self.max_length]
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to add the edges of an expanded node, new nodes are one hop further than the source
+    #--------------------------------------------------------------------------------------------------------------------------
+    def add_friends(self, source, targets):
+        # Only the root is not found before being expanded (first node of the journal)
+        depth = self.depths.setdefault(source, 0)
+        self.expanded.add(source)
+        for target in targets:
+            self.edge_list.append((source, target))
+            if target not in self.depths:
+                self.depths[target] = depth + 1
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to accumulate rows by columns: numbers in typed arrays, strings of few distinct values interned, other values in lists.
+# Rows are appended as lists of values in the columns order, and handed to pandas as columns without per row objects
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class ColumnStore():
+    # Typecodes of the arrays and numpy types by schema type
+    typecodes = {'int64': ('q', 'int64'), 'bool': ('b', 'bool')}
+
+    # Init constructor
+    def __init__(self, columns, types = None, intern = None):
+        # Column names in rows order
+        self.columns = list(columns)
+        types = types or {}
+        # One array (typed columns) or list by column
+        self.data = [array.array(self.typecodes[types[column]][0]) if types.get(column) in self.typecodes else []
+                     for column in self.columns]
+        # Positions of the interned columns, and their distinct strings
+        intern = set(intern or [])
+        self.interned = [i for i, column in enumerate(self.columns) if column in intern]
+        self.strings = {}
+        self._appends = [values.append for values in self.data]
+        # Positions of the typed columns kept as lists after a missing or out of range value
+        self.fallbacks = set()
+        self.rows = 0
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to append a row (list of values in the columns order)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def append(self, row):
+        for i in self.interned:
+            row[i] = self.strings.setdefault(row[i], row[i])
+        for i, (append, value) in enumerate(zip(self._appends, row)):
+            try:
+                append(value)
+            except (TypeError, OverflowError):
+                # Missing or out of range values, the column is kept as a list from now on (bools are stored as 0/1)
+                values = self.data[i].tolist()
+                if self.data[i].typecode == 'b':
+                    values = [bool(item) for item in values]
+                self.data[i] = values + [value]
+                self._appends[i] = self.data[i].append
+                self.fallbacks.add(i)
+        self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to transform the columns into a dataframe (arrays are copied into numpy arrays of their type)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def to_frame(self):
+        data = {}
+        for i, (column, values) in enumerate(zip(self.columns, self.data)):
+            if isinstance(values, array.array):
+                dtype = {code : dtype for code, dtype in self.typecodes.values()}[values.typecode]
+                values = np.frombuffer(values, dtype = 'int8' if dtype == 'bool' else dtype).astype(dtype)
+            elif i in self.fallbacks:
+                # Kept as objects, so ids with missing values are not upcast to floats
+                values = np.array(values, dtype = object)
+            data[column] = values
+        return pd.DataFrame(data, columns = self.columns)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to measure an extraction: seconds by stage, API calls and seconds by endpoint, rate limit waits, tweets/s and hits of
+# the users cache. Stage times are exclusive (a stage inside another one is not counted twice), so with the 'other' time
+# they add up to the elapsed time of a single miner (threads sharing the object add up their times)
+#   Optional arguments:
+#       - progress: Function called with report() at most every 'interval' seconds, as tweets arrive
+#       - profile: If True, a cProfile.Profile of the run is kept in 'profiler' (print it with print_profile()). cProfile
+#                  measures the thread that starts the run only, not the other miners of a thread pool
+#       - memory: If True, the run is traced with tracemalloc and report() has its 'peak_memory' in bytes
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class Metrics():
+    # Init constructor
+    def __init__(self, progress = None, interval = 5.0, profile = False, memory = False):
+        # Seconds by stage, API calls and seconds by endpoint
+        self.seconds = {}
+        self.api_calls = {}
+        self.api_seconds = {}
+        # Tweets received
+        self.tweets = 0
+        # Start and end of the run (perf_counter), and the miners running on it (the run ends when the last one stops)
+        self.started = None
+        self.finished = None
+        self._owners = set()
+        # Users cache whose stats are reported
+        self.user_cache = None
+        # Progress callback
+        self.progress = progress
+        self.interval = interval
+        self._last_progress = None
+        # Optional profilers
+        self.profiler = cProfile.Profile() if profile else None
+        self.memory = memory
+        self.peak_memory = None
+        # Lock to share the object between threads, and open timers by thread
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to start and stop the run. Miners sharing the object start and stop it as their 'owner': the profilers run
+    # from the first start to the stop of the last owner, and again when a new owner starts afterwards (a second start or
+    # stop of the same owner is ignored). The elapsed time goes from the first start to the last stop
+    #--------------------------------------------------------------------------------------------------------------------------
+    def start(self, owner = None):
+        with self._lock:
+            first = not self._owners
+            self._owners.add(owner)
+            if not first:
+                return
+            # A run started again after its owners stopped (e.g. miners one after the other) goes on measuring
+            if self.started is None:
+                self.started = self._last_progress = time.perf_counter()
+            self.finished = None
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop(self, owner = None):
+        with self._lock:
+            if owner not in self._owners:
+                return
+            self._owners.discard(owner)
+            if self._owners:
+                return
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self.peak_memory = max(self.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.finished = time.perf_counter()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Context manager to time a stage, without the time of the stages opened inside it. API calls give their endpoint
+    #--------------------------------------------------------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def timer(self, stage, endpoint = None):
+        # Seconds of the inner stages of each open timer of this thread
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - inner
+                if endpoint is not None:
+                    self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+                    self.api_seconds[endpoint] = self.api_seconds.get(endpoint, 0.0) + elapsed
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to count received tweets, and call the progress function when its interval has passed
+    #--------------------------------------------------------------------------------------------------------------------------
+    def add_tweets(self, count):
+        with self._lock:
+            self.tweets += count
+            now = time.perf_counter()
+            due = self.progress is not None and now - self._last_progress >= self.interval
+            if due:
+                self._last_progress = now
+        if due:
+            self.progress(self.report())
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return the measures as a dictionary
+    #--------------------------------------------------------------------------------------------------------------------------
+    def report(self):
+        with self._lock:
+            end = self.finished if self.finished is not None else time.perf_counter()
+            elapsed = end - self.started if self.started is not None else 0.0
+            stages = dict(self.seconds)
+            report = {'elapsed': elapsed,
+                      'tweets': self.tweets,
+                      'tweets_per_second': self.tweets / elapsed if elapsed else 0.0,
+                      'stages': stages,
+                      'api_calls': dict(self.api_calls),
+                      'api_seconds': dict(self.api_seconds),
+                      'rate_limit_wait': stages.get('rate_limit_wait', 0.0)}
+        # Time out of the timed stages
+        stages['other'] = max(elapsed - sum(stages.values()), 0.0)
+        if self.user_cache is not None:
+            report['user_cache'] = self.user_cache.stats()
+        if self.memory:
+            # Peak of the stopped runs, and of the one running
+            report['peak_memory'] = max(self.peak_memory or 0,
+                                        tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0)
+        return report
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to print the functions of the cProfile with most time (profile=True)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def print_profile(self, sort = 'cumulative', limit = 20):
+        pstats.Stats(self.profiler).sort_stats(sort).print_stats(limit)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to cache user profiles with time to live and least recently used eviction
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class UserCache():
+    # Init constructor
+    def __init__(self, maxsize = 10000, ttl = 3600):
+        # Max number of profiles to keep, the least recently used ones are evicted first
+        self.maxsize = maxsize
+        # Seconds a profile remains valid (None to keep it until evicted)
+        self.ttl = ttl
+        # Storage as user_id -> (expiration time, user dictionary), ordered from least to most recently used
+        self._store = OrderedDict()
+        # Counters to check how well the cache works
+        self.hits = 0
+        self.misses = 0
+        # Lock to share the cache between threads
+        self._lock = threading.RLock()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return a cached profile counting the lookup as a hit or a miss
+    #--------------------------------------------------------------------------------------------------------------------------
+    def get(self, user_id):
+        with self._lock:
+            user_dict = self.peek(user_id)
+            if user_dict is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store.move_to_end(str(user_id))
+            return user_dict
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return a cached profile without touching the counters (None if missing or expired)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def peek(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                return None
+            # Drop expired profiles
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self._store[key]
+                return None
+            return entry[1]
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to add a profile, evicting the least recently used ones when full
+    #--------------------------------------------------------------------------------------------------------------------------
+    def set(self, user_id, user_dict):
+        key = str(user_id)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._store[key] = (expires, user_dict)
+            self._store.move_to_end(key)
+            while len(self._store) > self.maxsize:
+                self._store.popitem(last = False)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to summarize the cache counters
+    #--------------------------------------------------------------------------------------------------------------------------
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._store),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self._store)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to share rate limit windows between workers, as token buckets by API object (credential set) and endpoint
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class RateLimitScheduler():
+    # Requests allowed per window with user authentication (endpoints not listed are not limited by the scheduler)
+    default_limits = {'user_timeline': 900, 'get_user': 900, 'lookup_users': 900,
+                      'get_friends': 15, 'get_friend_ids': 15}
+
+    # Init constructor
+    def __init__(self, limits = None, window = 15 * 60):
+        # Requests allowed per window for each endpoint
+        self.limits = {**self.default_limits, **(limits or {})}
+        # Seconds of each rate limit window
+        self.window = window
+        # Buckets as (api, endpoint) -> [available tokens, last refill time, blocked until]
+        self._buckets = {}
+        # Lock to share the scheduler between threads
+        self._lock = threading.Lock()
+        # Total seconds workers have waited for the rate limits
+        self.waited = 0.0
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to block until a request to the endpoint is allowed
+    #--------------------------------------------------------------------------------------------------------------------------
+    def acquire(self, endpoint, api = None):
+        while True:
+            with self._lock:
+                wait = self._take(endpoint, api)
+                if wait > 0:
+                    self.waited += wait
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Coroutine to wait until a request to the endpoint is allowed, without blocking the event loop
+    #--------------------------------------------------------------------------------------------------------------------------
+    async def acquire_async(self, endpoint, api = None):
+        while True:
+            with self._lock:
+                wait = self._take(endpoint, api)
+                if wait > 0:
+                    self.waited += wait
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to take one token from the bucket, returns the seconds to wait when there is none available
+    #--------------------------------------------------------------------------------------------------------------------------
+    def _take(self, endpoint, api):
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return 0
+        now = time.monotonic()
+        # New buckets start full, as a new rate limit window
+        bucket = self._buckets.setdefault((api, endpoint), [float(limit), now, 0.0])
+        if bucket[2] > now:
+            return bucket[2] - now
+        # Refill tokens proportionally to the elapsed time
+        bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit / self.window)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) * self.window / limit
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to empty a bucket for some seconds, used when the API answers with a rate limit error anyway
+    #--------------------------------------------------------------------------------------------------------------------------
+    def block(self, endpoint, api = None, seconds = 15 * 60):
+        limit = self.limits.get(endpoint, 1)
+        now = time.monotonic()
+        with self._lock:
+            # The window is full again once the block ends
+            bucket = self._buckets.setdefault((api, endpoint), [float(limit), now, 0.0])
+            bucket[2] = max(bucket[2], now + seconds)
+            bucket[0] = float(limit)
+            bucket[1] = bucket[2]
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to keep the highest tweet id extracted by screen name, in a json state file. A refresh stopped by max_length also
+# keeps the range of tweets it did not request (below 'max_id') and the highest id it saw ('newest_id')
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class CheckpointStore():
+    # Init constructor
+    def __init__(self, path):
+        # Filepath of the json state file
+        self.path = path
+        # Lock to share the store between threads
+        self._lock = threading.Lock()
+        # State as screen_name -> {'since_id': highest tweet id} (with 'max_id' and 'newest_id' while a refresh is incomplete)
+        self.state = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.state = json.load(file)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return the highest tweet id saved for a user (None if there is no checkpoint)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def get(self, screen_name):
+        with self._lock:
+            return self.state.get(screen_name.lower(), {}).get('since_id')
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return the whole state of a user (empty dictionary if there is no checkpoint)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def get_state(self, screen_name):
+        with self._lock:
+            return dict(self.state.get(screen_name.lower(), {}))
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to save the highest tweet id of a user, the file is replaced atomically. With max_id, the tweets in
+    # (since_id, max_id] are still to be requested and newest_id is the checkpoint once they are
+    #--------------------------------------------------------------------------------------------------------------------------
+    def set(self, screen_name, since_id, max_id = None, newest_id = None):
+        with self._lock:
+            state = {'since_id': since_id}
+            if max_id is not None:
+                state.update({'max_id': max_id, 'newest_id': newest_id})
+            self.state[screen_name.lower()] = state
+            with open(self.path + '.tmp', 'w') as file:
+                json.dump(self.state, file, indent = 2)
+            os.replace(self.path + '.tmp', self.path)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class of write-ahead journal: json entries appended one by line and synced to disk, read back after a crash.
+# A line cut by a crash (the last one) is dropped when reading and before appending
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class PageJournal():
+    # Init constructor
+    def __init__(self, path):
+        # Filepath of the jsonl journal
+        self.path = path
+        # File opened on the first append
+        self._file = None
+        # Lock to append from several threads
+        self._lock = threading.Lock()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to read all complete entries (empty list when there is no journal)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def entries(self):
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding = 'utf-8') as file:
+                for line in file:
+                    if not line.endswith('\n'):
+                        break
+                    entries.append(json.loads(line))
+        return entries
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to append an entry, it is on disk when the function returns
+    #--------------------------------------------------------------------------------------------------------------------------
+    def append(self, entry):
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = self.open()
+            self._file.write(line.encode('utf-8'))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to open the journal to append, truncated after its last complete line
+    #--------------------------------------------------------------------------------------------------------------------------
+    def open(self):
+        file = open(self.path, 'ab+')
+        size = file.seek(0, os.SEEK_END)
+        # Look for the last line break, by blocks from the end
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            file.seek(start)
+            position = file.read(end - start).rfind(b'\n')
+            if position >= 0:
+                end = start + position + 1
+                break
+            end = start
+        if end != size:
+            file.truncate(end)
+        return file
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to close the journal, and to remove it once its extraction is complete
+    #--------------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to store raw API responses in SQLite: statuses and users as compressed json keyed by their ids, and friends lists.
+# It answers the endpoints used by the miners (like ReplayAPI, reading from disk), so outputs can be rebuilt offline
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class RawCache():
+    # Init constructor
+    def __init__(self, path, compression_level = 6):
+        # Filepath of the SQLite database
+        self.path = path
+        # zlib level of the stored json
+        self.compression_level = compression_level
+        # Calls by endpoint when used as API
+        self.calls = {}
+        # Connection shared between threads, one statement at a time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread = False)
+        with self._lock, self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS statuses (id INTEGER PRIMARY KEY, screen_name TEXT, data BLOB);
+                CREATE INDEX IF NOT EXISTS statuses_timeline ON statuses (screen_name, id);
+                CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, screen_name TEXT, data BLOB);
+                CREATE INDEX IF NOT EXISTS users_screen_name ON users (screen_name);
+                CREATE TABLE IF NOT EXISTS friends (screen_name TEXT, position INTEGER, user_id INTEGER,
+                                                    PRIMARY KEY (screen_name, position));
+            ''')
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to compress and decompress a json object
+    #--------------------------------------------------------------------------------------------------------------------------
+    def dumps(self, obj):
+        return zlib.compress(json.dumps(obj).encode('utf-8'), self.compression_level)
+
+    @staticmethod
+    def loads(data):
+        return json.loads(zlib.decompress(data))
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to save statuses of a timeline, users and the friends list of a user (saved ids are replaced)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def add_statuses(self, screen_name, statuses):
+        rows = [(status['id'], screen_name.lower(), self.dumps(status)) for status in statuses]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO statuses VALUES (?, ?, ?)', rows)
+
+    def add_users(self, users):
+        rows = [(user['id'], user['screen_name'].lower(), self.dumps(user)) for user in users]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?)', rows)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Generator of saved statuses (of a user, or all of them) from newest to oldest, read by batches. With raw=True they are
+    # the compressed json (bytes), to be decoded by postprocess workers instead of this process
+    #--------------------------------------------------------------------------------------------------------------------------
+    def iter_statuses(self, screen_name = None, batch_size = 10000, raw = False):
+        # Each batch starts after the last (screen_name, id) read
+        last_name, last_id = (screen_name.lower() if screen_name is not None else ''), 2**63 - 1
+        while True:
+            if screen_name is not None:
+                rows = self.query('''SELECT screen_name, id, data FROM statuses WHERE screen_name = ? AND id < ?
+                                     ORDER BY id DESC LIMIT ?''', (last_name, last_id, batch_size))
+            else:
+                rows = self.query('''SELECT screen_name, id, data FROM statuses
+                                     WHERE screen_name > ? OR (screen_name = ? AND id < ?)
+                                     ORDER BY screen_name, id DESC LIMIT ?''', (last_name, last_name, last_id, batch_size))
+            for _, _, data in rows:
+                yield data if raw else self.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_name, last_id = rows[-1][0], rows[-1][1]
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return the saved users of a list of ids
+    #--------------------------------------------------------------------------------------------------------------------------
+    def get_users(self, user_ids):
+        users = []
+        user_ids = [int(user_id) for user_id in user_ids]
+        for i in range(0, len(user_ids), 500):
+            keys = user_ids[i:i+500]
+            users += [self.loads(data) for data, in self.query('SELECT data FROM users WHERE id IN (%s)'
+                                                               % ','.join('?' * len(keys)), keys)]
+        return users
+
+    def set_friends(self, screen_name, user_ids):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM friends WHERE screen_name = ?', (screen_name.lower(),))
+            self._connection.executemany('INSERT INTO friends VALUES (?, ?, ?)',
+                                         [(screen_name.lower(), i, user_id) for i, user_id in enumerate(user_ids)])
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to run a query, returns all rows
+    #--------------------------------------------------------------------------------------------------------------------------
+    def query(self, sql, parameters = ()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Endpoints, with the arguments and responses of ReplayAPI
+    #--------------------------------------------------------------------------------------------------------------------------
+    def user_timeline(self, screen_name = None, count = 20, max_id = None, since_id = None, include_rts = True,
+                      exclude_replies = False, **kwargs):
+        self.count_call('user_timeline')
+        rows = self.query('SELECT data FROM statuses WHERE screen_name = ? AND id <= ? AND id > ? ORDER BY id DESC LIMIT ?',
+                          (screen_name.lower(), max_id if max_id is not None else 2**63 - 1,
+                           since_id if since_id is not None else -1, min(count, 200)))
+        return filter_timeline([self.loads(data) for data, in rows], include_rts, exclude_replies)
+
+    def get_user(self, user_id = None, screen_name = None, **kwargs):
+        self.count_call('get_user')
+        if user_id is not None:
+            rows = self.query('SELECT data FROM users WHERE id = ?', (int(user_id),))
+        else:
+            rows = self.query('SELECT data FROM users WHERE screen_name = ?', (screen_name.lower(),))
+        if not rows:
+            raise ReplayAPI.error(404, 'Not Found', 50, 'User not found.')
+        return self.loads(rows[0][0])
+
+    def lookup_users(self, user_id = None, screen_name = None, **kwargs):
+        self.count_call('lookup_users')
+        if user_id is not None:
+            keys = [int(key) for key in user_id[:100]]
+            rows = self.query('SELECT data FROM users WHERE id IN (%s)' % ','.join('?' * len(keys)), keys)
+        else:
+            keys = [name.lower() for name in screen_name[:100]]
+            rows = self.query('SELECT data FROM users WHERE screen_name IN (%s)' % ','.join('?' * len(keys)), keys)
+        return [self.loads(data) for data, in rows]
+
+    def get_friends(self, screen_name = None, cursor = -1, count = 20, **kwargs):
+        self.count_call('get_friends')
+        start = 0 if cursor == -1 else cursor
+        count = min(count, 200)
+        rows = self.query('''SELECT users.data FROM friends JOIN users ON users.id = friends.user_id
+                             WHERE friends.screen_name = ? ORDER BY friends.position LIMIT ? OFFSET ?''',
+                          (screen_name.lower(), count + 1, start))
+        next_cursor = start + count if len(rows) > count else 0
+        return [self.loads(data) for data, in rows[:count]], (-start if start else 0, next_cursor)
+
+    def count_call(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to close the database
+    #--------------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Output writers: csv, Parquet and Feather (Arrow IPC). Each one can write a whole dataframe, or dataframes by chunks,
+# and read an output back (used to merge new tweets with a previous output)
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+
+# Columns and types of the outputs, used by the Parquet and Feather writers
+user_schema = [('name','string'),('screen_name','string'),('followers_count','int64'),
+               ('friends_count','int64'),('statuses_count','int64'),('favourites_count','int64')]
+timeline_schema = ([('tweet_id','int64'),('created_at','timestamp'),('full_text','string')]
+                   + [('source_node.'+ name, kind) for name, kind in user_schema]
+                   + [('favorited_by_source','bool'),('entities.hashtags','list<string>'),
+                      ('entities.user_mentions','list<string>'),('type','string')]
+                   + [('target_node.'+ name, kind) for name, kind in user_schema]
+                   + [('source_node.Giver','float64'),('target_node.Giver','float64'),
+                      ('source_node.Balanced','float64'),('target_node.Balanced','float64')])
+friends_schema = ([('id','int64')] + user_schema[:2] + [('description','string')] + user_schema[2:]
+                  + [('Giver','float64'),('Balanced','float64')])
+nodes_schema = friends_schema[:-2] + [('depth','int64')] + friends_schema[-2:]
+edges_schema = [('source','int64'),('target','int64')]
+
+class CSVWriter():
+    # Extension of the files written
+    extension = '.csv'
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write a dataframe as csv (the schema is not used, values are written as they are)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write(self, df, path, schema = None):
+        df.to_csv(path)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write dataframes by chunks, the first one creates the file with header. Returns number of rows
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write_chunks(self, frames, path, schema = None):
+        written = 0
+        first = True
+        for df in frames:
+            df.to_csv(path, mode = 'w' if first else 'a', header = first)
+            first = False
+            written += len(df)
+        return written
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to read an output, whole or by chunks (a directory is read as its csv files in name order)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def read(self, path):
+        if os.path.isdir(path):
+            files = sorted(name for name in os.listdir(path) if name.endswith(self.extension))
+            return pd.concat([pd.read_csv(os.path.join(path, name), index_col = 0) for name in files])
+        return pd.read_csv(path, index_col = 0)
+
+    def read_chunks(self, path, chunksize = 1000):
+        return pd.read_csv(path, index_col = 0, chunksize = chunksize)
+
+
+class ParquetWriter():
+    # Extension of the files written
+    extension = '.parquet'
+
+    # Init constructor
+    def __init__(self, compression = 'zstd', partition_cols = None):
+        # Compression codec
+        self.compression = compression
+        # Columns to partition the dataset by (e.g. ['source_node.screen_name', 'date']), 'path' is then a directory that
+        # is replaced on each write (a directory not written by this class is refused with a ValueError)
+        self.partition_cols = partition_cols
+        # pyarrow.dataset format to read outputs back
+        self.format = 'parquet'
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write a dataframe with the types of the schema
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write(self, df, path, schema = None):
+        self.write_chunks([df], path, schema = schema)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write dataframes by chunks into a single file, or new files of the partitions. Returns number of rows
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write_chunks(self, frames, path, schema = None):
+        pa = import_pyarrow()
+        # A partitioned dataset is written from scratch. An existing directory is only removed when it is empty or a
+        # dataset written by this class (marked by its '_common_metadata' file)
+        metadata_path = os.path.join(path, '_common_metadata')
+        if self.partition_cols and os.path.isdir(path):
+            if os.listdir(path) and not os.path.exists(metadata_path):
+                raise ValueError('%s is not a dataset written by ParquetWriter, remove it or choose another path' % path)
+            shutil.rmtree(path)
+        writer = None
+        written = 0
+        for i, df in enumerate(frames):
+            table = arrow_table(df, schema, self.partition_cols)
+            if self.partition_cols:
+                if i == 0:
+                    os.makedirs(path)
+                    pa.parquet.write_metadata(table.schema, metadata_path)
+                pa.parquet.write_to_dataset(table, path, partition_cols = self.partition_cols, compression = self.compression,
+                                            basename_template = 'part-%d-{i}.parquet' % i)
+            else:
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(path, table.schema, compression = self.compression)
+                writer.write_table(table)
+            written += len(df)
+        if writer is not None:
+            writer.close()
+        return written
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to read an output, whole or by chunks (partition columns are included)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def read(self, path):
+        return self.dataset(path).to_table().to_pandas()
+
+    def read_chunks(self, path, chunksize = 1000):
+        for batch in self.dataset(path).to_batches(batch_size = chunksize):
+            yield batch.to_pandas()
+
+    def dataset(self, path):
+        pa = import_pyarrow()
+        return pa.dataset.dataset(path, format = self.format, partitioning = 'hive' if os.path.isdir(path) else None)
+
+
+class FeatherWriter(ParquetWriter):
+    # Extension of the files written
+    extension = '.feather'
+
+    # Init constructor
+    def __init__(self, compression = 'zstd'):
+        super().__init__(compression = compression)
+        self.format = 'ipc'
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to write dataframes by chunks as record batches of an Arrow IPC file. Returns number of rows
+    #--------------------------------------------------------------------------------------------------------------------------
+    def write_chunks(self, frames, path, schema = None):
+        pa = import_pyarrow()
+        writer = None
+        written = 0
+        for df in frames:
+            table = arrow_table(df, schema)
+            if writer is None:
+                writer = pa.ipc.new_file(path, table.schema, options = pa.ipc.IpcWriteOptions(compression = self.compression))
+            writer.write_table(table)
+            written += len(df)
+        if writer is not None:
+            writer.close()
+        return written
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to replay statuses and users locally, with the endpoints and responses of tweepy.API (dictionaries instead of models).
+# Used to test and benchmark the extraction without Twitter credentials
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class ReplayAPI():
+    # Init constructor
+    def __init__(self, statuses = None, users = None, friends = None, latency = 0, rate_limits = None, window = 900):
+        # Timelines as screen_name -> statuses from newest to oldest, with their negative ids to search pages
+        self.timelines = {}
+        self._keys = {}
+        # Users as id_str -> user dictionary
+        self.users = {}
+        # Friends as screen_name -> list of user ids
+        self.friends = {}
+        # Seconds to sleep in each call
+        self.latency = latency
+        # Calls allowed by endpoint in each window of seconds, a TooManyRequests error is raised beyond them
+        self.rate_limits = rate_limits or {}
+        self.window = window
+        # Calls by endpoint, and how many of them were answered with 429
+        self.calls = {}
+        self.rate_limited = 0
+        self._windows = {}
+        self._lock = threading.Lock()
+
+        # Initial data: statuses as screen_name -> list, users as a list, friends as screen_name -> list of ids
+        for screen_name, user_statuses in (statuses or {}).items():
+            self.add_statuses(screen_name, user_statuses)
+        for user in users or []:
+            self.add_user(user)
+        for screen_name, friend_ids in (friends or {}).items():
+            self.friends[screen_name.lower()] = list(friend_ids)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to load and save a fixture (json file with 'statuses', 'users' and 'friends')
+    #--------------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as file:
+            fixture = json.load(file)
+        return cls(statuses = fixture.get('statuses'), users = fixture.get('users'), friends = fixture.get('friends'), **kwargs)
+
+    def save(self, path):
+        fixture = {'statuses': self.timelines, 'users': list(self.users.values()), 'friends': self.friends}
+        with open(path, 'w') as file:
+            json.dump(fixture, file)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Functions to add statuses (merged by id into the timeline) and users
+    #--------------------------------------------------------------------------------------------------------------------------
+    def add_statuses(self, screen_name, statuses):
+        screen_name = screen_name.lower()
+        timeline = {status['id'] : status for status in self.timelines.get(screen_name, [])}
+        for status in statuses:
+            timeline[status['id']] = status
+            if 'user' in status:
+                self.add_user(status['user'])
+        self.timelines[screen_name] = [timeline[key] for key in sorted(timeline, reverse = True)]
+        self._keys[screen_name] = [-key for key in sorted(timeline, reverse = True)]
+
+    def add_user(self, user):
+        self.users[str(user['id'])] = user
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Endpoints
+    #--------------------------------------------------------------------------------------------------------------------------
+    def user_timeline(self, screen_name = None, count = 20, max_id = None, since_id = None, include_rts = True,
+                      exclude_replies = False, **kwargs):
+        self.request('user_timeline')
+        timeline = self.timelines.get(screen_name.lower(), [])
+        keys = self._keys.get(screen_name.lower(), [])
+        # Statuses from max_id (included) to since_id (excluded)
+        start = 0 if max_id is None else bisect.bisect_left(keys, -max_id)
+        end = len(keys) if since_id is None else bisect.bisect_left(keys, -since_id)
+        return filter_timeline(timeline[start:min(end, start + min(count, 200))], include_rts, exclude_replies)
+
+    def get_user(self, user_id = None, screen_name = None, **kwargs):
+        self.request('get_user')
+        if user_id is not None and str(user_id) in self.users:
+            return self.users[str(user_id)]
+        for user in self.users.values():
+            if screen_name is not None and user['screen_name'].lower() == screen_name.lower():
+                return user
+        raise self.error(404, 'Not Found', 50, 'User not found.')
+
+    def lookup_users(self, user_id = None, screen_name = None, **kwargs):
+        self.request('lookup_users')
+        if user_id is not None:
+            return [self.users[str(key)] for key in user_id[:100] if str(key) in self.users]
+        screen_names = {name.lower() for name in screen_name[:100]}
+        return [user for user in self.users.values() if user['screen_name'].lower() in screen_names]
+
+    def get_friends(self, screen_name = None, user_id = None, cursor = -1, count = 20, **kwargs):
+        self.request('get_friends')
+        ids, cursors = self.friend_page(screen_name, user_id, cursor, min(count, 200))
+        return [self.users[str(key)] for key in ids if str(key) in self.users], cursors
+
+    def get_friend_ids(self, screen_name = None, user_id = None, cursor = -1, count = 5000, **kwargs):
+        self.request('get_friend_ids')
+        return self.friend_page(screen_name, user_id, cursor, min(count, 5000))
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to return a page of friend ids and (previous, next) cursors, cursors are offsets (0 at the end).
+    # Friends are found by screen name, or by user id (as key, or through the screen name of the user)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def friend_page(self, screen_name, user_id, cursor, count):
+        if screen_name is None and str(user_id) not in self.friends and str(user_id) in self.users:
+            screen_name = self.users[str(user_id)]['screen_name']
+        friend_ids = self.friends.get(screen_name.lower() if screen_name is not None else str(user_id), [])
+        start = 0 if cursor == -1 else cursor
+        next_cursor = start + count if start + count < len(friend_ids) else 0
+        return friend_ids[start:start + count], (-start if start else 0, next_cursor)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to count a call, apply latency and raise TooManyRequests beyond the rate limit of the endpoint
+    #--------------------------------------------------------------------------------------------------------------------------
+    def request(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            limit = self.rate_limits.get(endpoint)
+            if limit is not None:
+                now = time.time()
+                start, used = self._windows.get(endpoint, (now, 0))
+                if now >= start + self.window:
+                    start, used = now, 0
+                if used >= limit:
+                    self.rate_limited += 1
+                    raise self.error(429, 'Too Many Requests', 88, 'Rate limit exceeded', reset = start + self.window)
+                self._windows[endpoint] = (start, used + 1)
+        if self.latency:
+            time.sleep(self.latency)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to build the tweepy exception of an error response
+    #--------------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def error(status_code, reason, code, message, reset = None):
+        headers = {'x-rate-limit-reset': str(int(reset))} if reset is not None else None
+        return tweepy_error(status_code, reason, json.dumps({'errors': [{'code': code, 'message': message}]}).encode(),
+                            headers)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class to record the responses of a tweepy API into a ReplayAPI fixture, while extracting as usual
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class RecordingAPI():
+    # Init constructor
+    def __init__(self, api, fixture = None):
+        # Recorded API
+        self.api = api
+        # Responses as ReplayAPI
+        self.fixture = fixture if fixture is not None else ReplayAPI()
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Endpoints, requested to the recorded API
+    #--------------------------------------------------------------------------------------------------------------------------
+    def user_timeline(self, screen_name = None, **kwargs):
+        page = self.api.user_timeline(screen_name = screen_name, **kwargs)
+        self.fixture.add_statuses(screen_name, [tweepy_json(status) for status in page])
+        return page
+
+    def get_user(self, **kwargs):
+        user = self.api.get_user(**kwargs)
+        self.fixture.add_user(tweepy_json(user))
+        return user
+
+    def lookup_users(self, **kwargs):
+        users = self.api.lookup_users(**kwargs)
+        for user in users:
+            self.fixture.add_user(tweepy_json(user))
+        return users
+
+    def get_friends(self, **kwargs):
+        users, cursors = self.api.get_friends(**kwargs)
+        for user in users:
+            self.fixture.add_user(tweepy_json(user))
+        self.friend_ids(kwargs).extend(tweepy_json(user)['id'] for user in users)
+        return users, cursors
+
+    def get_friend_ids(self, **kwargs):
+        ids, cursors = self.api.get_friend_ids(**kwargs)
+        self.friend_ids(kwargs).extend(ids)
+        return ids, cursors
+
+    # Recorded friend ids of the requested screen name or user id
+    def friend_ids(self, kwargs):
+        key = kwargs['screen_name'].lower() if kwargs.get('screen_name') is not None else str(kwargs.get('user_id'))
+        return self.fixture.friends.setdefault(key, [])
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to save the recorded fixture, load it later with ReplayAPI.from_file(path)
+    #--------------------------------------------------------------------------------------------------------------------------
+    def save(self, path):
+        self.fixture.save(path)
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Class of asynchronous client of the API v1.1 endpoints used by the miners (aiohttp with OAuth 1.0a user authentication).
+# Endpoints are coroutines that return dictionaries (as ReplayAPI), requests share a pool of keep-alive connections and at
+# most 'max_connections' of them are in flight at once. Errors are raised as the tweepy exceptions
+#   Optional arguments:
+#       - host: Base url of the API, e.g. the url of a local mock server
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+class AsyncAPI():
+    # Paths of the endpoints
+    paths = {'user_timeline': 'statuses/user_timeline', 'get_user': 'users/show', 'lookup_users': 'users/lookup',
+             'get_friends': 'friends/list', 'get_friend_ids': 'friends/ids'}
+
+    # Init constructor
+    def __init__(self, consumerKey, consumerSecret, accessToken, accessTokenSecret, max_connections = 100,
+                 host = 'https://api.twitter.com/1.1/'):
+        import_aiohttp()
+        import oauthlib.oauth1
+        # Signer of the requests
+        self.oauth = oauthlib.oauth1.Client(consumerKey, client_secret = consumerSecret, resource_owner_key = accessToken,
+                                            resource_owner_secret = accessTokenSecret)
+        self.host = host
+        self.max_connections = max_connections
+        # Session and semaphore, created in the event loop of the first request
+        self.session = None
+        self.semaphore = None
+        # Calls by endpoint
+        self.calls = {}
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Endpoints, with the arguments of the tweepy ones
+    #--------------------------------------------------------------------------------------------------------------------------
+    async def user_timeline(self, **kwargs):
+        return await self.request('user_timeline', **kwargs)
+
+    async def get_user(self, **kwargs):
+        return await self.request('get_user', **kwargs)
+
+    async def lookup_users(self, **kwargs):
+        return await self.request('lookup_users', **kwargs)
+
+    async def get_friends(self, **kwargs):
+        page = await self.request('get_friends', **kwargs)
+        return page['users'], (page['previous_cursor'], page['next_cursor'])
+
+    async def get_friend_ids(self, **kwargs):
+        page = await self.request('get_friend_ids', **kwargs)
+        return page['ids'], (page['previous_cursor'], page['next_cursor'])
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to sign and send a GET request, returns the decoded json (lists of ids are sent comma separated)
+    #--------------------------------------------------------------------------------------------------------------------------
+    async def request(self, endpoint, **kwargs):
+        aiohttp = import_aiohttp()
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.max_connections))
+            self.semaphore = asyncio.Semaphore(self.max_connections)
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = {}
+        for key, value in kwargs.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = ','.join(map(str, value))
+            params[key] = str(value).lower() if isinstance(value, bool) else str(value)
+        url = self.host + self.paths[endpoint] + '.json'
+        if params:
+            url += '?' + urllib.parse.urlencode(params, quote_via = urllib.parse.quote)
+        url, headers, _ = self.oauth.sign(url)
+        async with self.semaphore:
+            async with self.session.get(url, headers = headers) as response:
+                content = await response.read()
+        if response.status != 200:
+            raise tweepy_error(response.status, response.reason, content, response.headers)
+        return json.loads(content)
+
+    #--------------------------------------------------------------------------------------------------------------------------
+    # Function to close the connections, the next request opens a new session
+    #--------------------------------------------------------------------------------------------------------------------------
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        self.session = None
+        self.semaphore = None
+
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+# Global Scope functions
+# -------------------------------------------------------------------------------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------------------
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Generator to chain new dataframes with the ones of a previous output, skipping tweets already in the new ones (unless the
+# key is not in the columns, e.g. projected out)
+#--------------------------------------------------------------------------------------------------------------------------
+def merge_chunks(frames, previous_frames, key = 'tweet_id'):
+    new_ids = set()
+    columns = None
+    position = 0
+    for df in frames:
+        if key in df:
+            new_ids.update(df[key])
+        columns = df.columns
+        position += len(df)
+        yield df
+    for df in previous_frames:
+        if key in df:
+            df = df[~df[key].isin(new_ids)]
+        df = df.reindex(columns = columns)
+        # Keep the index running after the new rows
+        df.index = range(position, position + len(df))
+        position += len(df)
+        yield df
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to replace an output (file or partitioned directory) by a new one
+#--------------------------------------------------------------------------------------------------------------------------
+def replace_output(new_path, path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(new_path, path)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to remove an output (file or partitioned directory), if it exists
+#--------------------------------------------------------------------------------------------------------------------------
+def remove_output(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to create the tweepy API object from the credentials provided by Twitter Dev API
+#--------------------------------------------------------------------------------------------------------------------------
+def build_api(consumerKey, consumerSecret, accessToken, accessTokenSecret, wait_on_rate_limit = True):
+    # Authorize Access to the API using .OAuthHandler().
+    authenticate = tweepy.OAuthHandler(consumerKey, consumerSecret)
+    # Set the Access tokens.
+    authenticate.set_access_token(accessToken, accessTokenSecret)
+    # Create the API object while passing in the auth information.
+    return tweepy.API(authenticate, wait_on_rate_limit = wait_on_rate_limit)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to request an endpoint of the API object, waiting on the scheduler and retrying after rate limit errors
+#--------------------------------------------------------------------------------------------------------------------------
+def call_api(api, endpoint, scheduler = None, metrics = None, **kwargs):
+    while True:
+        # Wait for the endpoint window of this credential set
+        if scheduler is not None:
+            with stage_timer(metrics, 'rate_limit_wait'):
+                scheduler.acquire(endpoint, api)
+        try:
+            with stage_timer(metrics, 'api', endpoint):
+                return getattr(api, endpoint)(**kwargs)
+        except tweepy.TooManyRequests as error:
+            wait = reset_wait(error)
+            if scheduler is not None:
+                scheduler.block(endpoint, api, wait)
+            else:
+                with stage_timer(metrics, 'rate_limit_wait'):
+                    time.sleep(wait)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Coroutine version of call_api for the AsyncAPI endpoints, waits on the scheduler and rate limits without blocking the loop
+#--------------------------------------------------------------------------------------------------------------------------
+async def call_api_async(api, endpoint, scheduler = None, **kwargs):
+    while True:
+        if scheduler is not None:
+            await scheduler.acquire_async(endpoint, api)
+        try:
+            return await getattr(api, endpoint)(**kwargs)
+        except tweepy.TooManyRequests as error:
+            wait = reset_wait(error)
+            if scheduler is not None:
+                scheduler.block(endpoint, api, wait)
+            else:
+                await asyncio.sleep(wait)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to return the seconds until the rate limit window of a TooManyRequests error is reset (a full window when the
+# header is missing)
+#--------------------------------------------------------------------------------------------------------------------------
+def reset_wait(error):
+    reset = error.response.headers.get('x-rate-limit-reset')
+    return max(int(reset) - time.time(), 0) + 1 if reset else 15 * 60
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to build the tweepy exception of an error response, from its status code, body and headers
+#--------------------------------------------------------------------------------------------------------------------------
+def tweepy_error(status_code, reason, content = b'', headers = None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response._content = content
+    response.headers.update(headers or {})
+    errors = {400: tweepy.BadRequest, 401: tweepy.Unauthorized, 403: tweepy.Forbidden, 404: tweepy.NotFound,
+              429: tweepy.TooManyRequests}
+    if status_code >= 500:
+        return tweepy.TwitterServerError(response)
+    return errors.get(status_code, tweepy.HTTPException)(response)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to time a stage in a Metrics object, nothing is timed when it is None
+#--------------------------------------------------------------------------------------------------------------------------
+def stage_timer(metrics, stage, endpoint = None):
+    return metrics.timer(stage, endpoint) if metrics is not None else contextlib.nullcontext()
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to get user dictionaries through a cache, missing ones are requested in batches of 100 ids.
+# Returns a dictionary id_str -> user dictionary (users not returned by the API, e.g. suspended, are left out).
+# 'on_lookup' is called with the list of user dictionaries of each request
+#--------------------------------------------------------------------------------------------------------------------------
+def hydrate_users(api, user_ids, user_cache, scheduler = None, on_lookup = None, metrics = None):
+    users = {}
+    # Unique ids, those found in cache are not requested (each lookup counts as a hit or a miss)
+    missing = []
+    for user_id in dict.fromkeys(str(user_id) for user_id in user_ids):
+        user_dict = user_cache.get(user_id)
+        if user_dict is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user_dict
+    # Bulk requests, lookup_users accepts up to 100 ids per call
+    for i in range(0, len(missing), 100):
+        batch = [tweepy_json(user) for user in call_api(api, 'lookup_users', scheduler = scheduler, metrics = metrics,
+                                                        user_id = missing[i:i+100])]
+        for user_dict in batch:
+            user_cache.set(user_dict['id_str'], user_dict)
+            users[user_dict['id_str']] = user_dict
+        if on_lookup is not None:
+            on_lookup(batch)
+    return users
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to extract many users concurrently, sharing credential sets, rate limit windows and the users cache.
+# API objects can be given instead of credentials in 'apis' (or one in 'api'), e.g. ReplayAPI or tweepy APIs built elsewhere.
+# With the Friend_crawler miner, 'depth' is the hops of each crawl and max_length the friends requested by node.
+# Returns a dictionary username -> tlminer/Friend_search/Friend_crawler object (or the exception raised for that user)
+#--------------------------------------------------------------------------------------------------------------------------
+def batch_extract(usernames, max_length, path, credentials = None, miner = None, max_workers = 8, apis = None, depth = 1,
+                  **kwargs):
+    # Default extractor
+    miner = miner if miner is not None else tlminer
+    # Each user needs its own output
+    if '{username}' not in path:
+        raise ValueError("path must contain the '{username}' placeholder, e.g. 'output/{username}.csv': %s" % path)
+    if 'api' in kwargs:
+        apis = [kwargs.pop('api')]
+    if apis is None:
+        if credentials is None:
+            raise ValueError('batch_extract needs credentials or apis')
+        # A single credential set can be given as a tuple (consumerKey, consumerSecret, accessToken, accessTokenSecret)
+        if isinstance(credentials[0], str):
+            credentials = [credentials]
+        # One API object by credential set, rate limits are handled by the shared scheduler
+        apis = [build_api(*credential, wait_on_rate_limit = False) for credential in credentials]
+    else:
+        # The miners take the API objects as they are (credentials are only used to build them)
+        credentials = [(None, None, None, None)]
+    kwargs.setdefault('scheduler', RateLimitScheduler())
+    if issubclass(miner, (Miner, Friend_crawler)):
+        kwargs.setdefault('user_cache', UserCache())
+    if issubclass(miner, Miner):
+        kwargs.setdefault('metrics', Metrics())
+    # The crawler takes the hops in place of max_length, which caps the friends by node
+    if issubclass(miner, Friend_crawler):
+        kwargs['max_length'] = max_length
+        max_length = depth
+
+    # Credential sets (and their API objects) are assigned round robin, 'path' is formatted with each username
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = {executor.submit(miner, username, max_length, path.format(username = username),
+                                   *credentials[i % len(credentials)], api = apis[i % len(apis)], **kwargs) : username
+                   for i, username in enumerate(usernames)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                results[futures[future]] = error
+    return results
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Coroutine to extract many users with an AsyncAPI. The timelines (or friends) of up to 'max_concurrency' users are requested
+# at once, then each one is transformed by the miner (tlminer or Friend_search) in a thread, from a ReplayAPI with the
+# responses, so 'data' has the same columns and types as in the sync extraction. 'kwargs' go to the miner, except the
+# scheduler, used by the requests. Returns a dictionary username -> tlminer/Friend_search object (or the exception raised)
+#   e.g. asyncio.run(async_extract(usernames, 3200, 'output/{username}.csv', AsyncAPI(*credentials)))
+#--------------------------------------------------------------------------------------------------------------------------
+async def async_extract(usernames, max_length, path, api, miner = None, max_concurrency = 16, **kwargs):
+    miner = miner if miner is not None else tlminer
+    if not issubclass(miner, (Miner, Friend_search)):
+        raise ValueError('async_extract supports Miner and Friend_search extractors, not %s' % miner.__name__)
+    scheduler = kwargs.pop('scheduler', None)
+    if issubclass(miner, Miner):
+        kwargs.setdefault('user_cache', UserCache())
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def extract(username):
+        # Extractor without API, it gives the ids range, filters and columns of the requests
+        extractor = miner(username, max_length, path.format(username = username), None, None, None, None, run = False,
+                          **kwargs)
+        async with semaphore:
+            if isinstance(extractor, Miner):
+                statuses, users = await fetch_timeline(api, username, max_length, since_id = extractor.since_id,
+                                                       max_id = extractor.max_id, scheduler = scheduler,
+                                                       user_cache = extractor.user_cache,
+                                                       lookup_users = bool(extractor.target_user_cols), **extractor.filters)
+                extractor._api = ReplayAPI(statuses = {username: statuses}, users = users)
+            else:
+                friends = await fetch_friends(api, username, max_length, scheduler = scheduler)
+                extractor._api = ReplayAPI(users = friends, friends = {username: [friend['id'] for friend in friends]})
+        # The transformation runs in a thread while the next users are requested
+        await loop.run_in_executor(None, extractor.run)
+        return extractor
+
+    results = await asyncio.gather(*(extract(username) for username in usernames), return_exceptions = True)
+    return dict(zip(usernames, results))
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Coroutine to request the timeline of a user (statuses in (since_id, max_id], within max_length) from an AsyncAPI.
+# Pages are requested by max_id one after the other, the replied users of each page are looked up while the next one is
+# requested (unless lookup_users is False). 'filters' are include_rts/exclude_replies.
+# Returns (list of status dictionaries, list of replied user dictionaries)
+#--------------------------------------------------------------------------------------------------------------------------
+async def fetch_timeline(api, screen_name, max_length, since_id = None, max_id = None, scheduler = None, user_cache = None,
+                         lookup_users = True, **filters):
+    user_cache = user_cache if user_cache is not None else UserCache()
+    statuses = []
+    lookups = []
+    requested = set()
+    remaining = max_length or None
+    try:
+        while remaining is None or remaining > 0:
+            page = await call_api_async(api, 'user_timeline', scheduler = scheduler, screen_name = screen_name,
+                                        tweet_mode = 'extended', count = min(remaining or 200, 200), max_id = max_id,
+                                        since_id = since_id)
+            if len(page) == 0:
+                break
+            # Pages are filtered as they arrive (see Miner.filters), the next one is older than the unfiltered page
+            max_id = min(status['id'] for status in page) - 1
+            page = filter_timeline(page, **filters)[:remaining]
+            if not page:
+                continue
+            statuses.extend(page)
+            user_ids = [user_id for user_id in replied_users(page) if user_id not in requested] if lookup_users else []
+            requested.update(user_ids)
+            lookups.append(asyncio.ensure_future(hydrate_users_async(api, user_ids, user_cache, scheduler = scheduler)))
+            if remaining is not None:
+                remaining -= len(page)
+        users = {}
+        for batch in await asyncio.gather(*lookups):
+            users.update(batch)
+    except BaseException:
+        for lookup in lookups:
+            lookup.cancel()
+        raise
+    return statuses, list(users.values())
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Coroutine version of hydrate_users for an AsyncAPI, the batches of 100 missing ids are requested at once
+#--------------------------------------------------------------------------------------------------------------------------
+async def hydrate_users_async(api, user_ids, user_cache, scheduler = None):
+    users = {}
+    missing = []
+    for user_id in dict.fromkeys(str(user_id) for user_id in user_ids):
+        user_dict = user_cache.get(user_id)
+        if user_dict is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user_dict
+    batches = await asyncio.gather(*(call_api_async(api, 'lookup_users', scheduler = scheduler, user_id = missing[i:i+100])
+                                     for i in range(0, len(missing), 100)))
+    for batch in batches:
+        for user_dict in batch:
+            user_cache.set(user_dict['id_str'], user_dict)
+            users[user_dict['id_str']] = user_dict
+    return users
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Coroutine to request the friends of a user (200 per page, within max_length) from an AsyncAPI, as user dictionaries
+#--------------------------------------------------------------------------------------------------------------------------
+async def fetch_friends(api, screen_name, max_length = None, scheduler = None):
+    friends = []
+    remaining = max_length or None
+    cursor = -1
+    while cursor != 0 and (remaining is None or remaining > 0):
+        page, (_, cursor) = await call_api_async(api, 'get_friends', scheduler = scheduler, screen_name = screen_name,
+                                                 cursor = cursor, count = 200)
+        page = page[:remaining]
+        friends.extend(page)
+        if remaining is not None:
+            remaining -= len(page)
+    return friends
+
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to transform raw statuses (e.g. from a RawCache) into the tlminer dataset, by shards over a process pool.
+#   - statuses: Iterable of status dictionaries, read by shards of 'shard_size' so they are not all in memory. They can also
+#               be compressed json from RawCache.iter_statuses(raw=True), decoded in parallel by the workers
+#   - users: Dictionary id_str -> user dictionary, or RawCache, with the replied users (a RawCache is read by the workers)
+#   - path: When given, each shard is written by its process as a file of the 'path' directory (part-00000.csv, ...),
+#           a dataset that writer.read(path) reads back. Otherwise the shards are merged into one dataframe, with the rows
+#           order of tlminer (tweets, quoted, replies and retweets)
+#   - max_workers: Processes (None for one by CPU)
+# On Linux, each shard gets a worker forked once it is read, which finds the shard in its memory, so the statuses are not
+# serialized to the workers (pickling them cost as much as transforming them). Up to max_workers run at once, and the next
+# shard is read and forked as soon as one is done. Elsewhere (fork is unsafe on macOS) shards are sent to one pool, at most
+# 2 by process in flight. Returns the dataframe, or the list of files written
+#--------------------------------------------------------------------------------------------------------------------------
+def postprocess(statuses, users, path = None, writer = None, max_workers = None, shard_size = 50000):
+    writer = writer if writer is not None else CSVWriter()
+    if path is not None:
+        if getattr(writer, 'partition_cols', None):
+            raise ValueError('Shards are written as files of a directory, use a writer without partition_cols')
+        os.makedirs(path, exist_ok = True)
+    # Replied users of a shard, sent with it (or the RawCache path, to be read by the worker)
+    if isinstance(users, RawCache):
+        shard_users = lambda shard: users.path
+    else:
+        shard_users = lambda shard: [users[user_id] for user_id in replied_users(shard) if user_id in users]
+
+    # Arguments of transform_shard by shard: statuses, users, index of the first row, output path and writer
+    def shards():
+        start = 0
+        for i, shard in enumerate(iter(lambda: list(itertools.islice(statuses, shard_size)), [])):
+            shard_path = os.path.join(path, 'part-%05d%s' % (i, writer.extension)) if path is not None else None
+            yield shard, shard_users(shard), start, shard_path, writer
+            start += len(shard)
+
+    results = {}
+    statuses = iter(statuses)
+    max_workers = max_workers or os.cpu_count() or 1
+    fork = sys.platform.startswith('linux')
+    executor = None if fork else concurrent.futures.ProcessPoolExecutor(max_workers = max_workers)
+    # Shard number of each future in flight, bounded so memory stays flat with large inputs
+    pending = {}
+    try:
+        for i, arguments in enumerate(shards()):
+            while len(pending) >= (max_workers if fork else 2 * max_workers):
+                done, _ = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            if fork:
+                # Forked workers get their initargs without pickling
+                shard_executor = concurrent.futures.ProcessPoolExecutor(max_workers = 1,
+                                                                        mp_context = multiprocessing.get_context('fork'),
+                                                                        initializer = load_worker_shard,
+                                                                        initargs = (arguments,))
+                future = shard_executor.submit(transform_worker_shard)
+                shard_executor.shutdown(wait = False)
+            else:
+                shard, shard_users_, start, shard_path, _ = arguments
+                future = executor.submit(transform_shard, shard, shard_users_, start = start, path = shard_path,
+                                         writer = writer)
+            pending[future] = i
+        for future in concurrent.futures.as_completed(pending):
+            results[pending[future]] = future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    results = [results[i] for i in sorted(results)]
+
+    if path is not None:
+        return results
+    # Merge: shards in order, then rows by type of tweet keeping their order
+    columns = Miner(None, None, None, None, None, None, None, run = False).data_cols
+    if not results:
+        return add_metrics(pd.DataFrame(columns = columns), prefixes = ['source_node.','target_node.'])
+    data = pd.concat(results)
+    rank = data['type'].map({'Tweet': 0, 'Quoted': 1, 'Replied': 2, 'Retweet': 3})
+    data = data.iloc[np.argsort(rank.to_numpy(), kind = 'stable')]
+    return data.reset_index(drop = True)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Shard of a forked postprocess worker, set in the worker by the pool initializer, and function to transform it
+#--------------------------------------------------------------------------------------------------------------------------
+worker_shard = None
+
+def load_worker_shard(arguments):
+    global worker_shard
+    worker_shard = arguments
+
+def transform_worker_shard():
+    statuses, users, start, path, writer = worker_shard
+    return transform_shard(statuses, users, start = start, path = path, writer = writer)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to transform a shard of statuses in a worker process: flattening, text cleaning and metrics. Rows are indexed
+# from 'start'. 'statuses' may be compressed json and 'users' the path of a RawCache. Returns the dataframe, or the path
+# it was written to
+#--------------------------------------------------------------------------------------------------------------------------
+def transform_shard(statuses, users, start = 0, path = None, writer = None):
+    statuses = [RawCache.loads(status) if isinstance(status, bytes) else status for status in statuses]
+    if isinstance(users, str):
+        raw_cache = RawCache(users)
+        users = raw_cache.get_users(replied_users(statuses))
+        raw_cache.close()
+    # Miner over the replied users of the shard, nothing is requested to Twitter
+    miner = Miner(None, None, None, None, None, None, None, api = ReplayAPI(users = users), run = False)
+    miner.fetch(statuses)
+    frames = [store.to_frame() for store in [miner.tweets, miner.quotes, miner.replies, miner.retweets] if store]
+    df = pd.concat(frames) if frames else pd.DataFrame(columns = miner.data_cols)
+    df = df.reindex(columns = miner.data_cols)
+    df.index = range(start, start + len(df))
+    df['full_text'] = cleanText_batch(df['full_text'])
+    add_metrics(df, prefixes = ['source_node.','target_node.'])
+    if path is None:
+        return df
+    writer = writer if writer is not None else CSVWriter()
+    writer.write(df, path, schema = timeline_schema)
+    return path
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to return the unique ids (id_str) of the users replied by a list of statuses
+#--------------------------------------------------------------------------------------------------------------------------
+def replied_users(statuses):
+    return list(dict.fromkeys(status['in_reply_to_user_id_str'] for status in statuses if tweet_kind(status) == 'Replied'))
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to label a tweet dictionary as Quoted, Retweet, Replied or Tweet
+#--------------------------------------------------------------------------------------------------------------------------
+def tweet_kind(newtweet):
+    if 'quoted_status' in newtweet:
+        return 'Quoted'
+    elif 'retweeted_status' in newtweet:
+        return 'Retweet'
+    elif newtweet['in_reply_to_status_id'] != None:
+        return 'Replied'
+    return 'Tweet'
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to filter a page of the timeline as the API does with include_rts and exclude_replies (after taking 'count'
+# statuses, so filtered pages can be shorter)
+#--------------------------------------------------------------------------------------------------------------------------
+def filter_timeline(statuses, include_rts = True, exclude_replies = False):
+    if not include_rts:
+        statuses = [status for status in statuses if 'retweeted_status' not in status]
+    if exclude_replies:
+        statuses = [status for status in statuses if status['in_reply_to_status_id'] is None]
+    return statuses
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Functions for windows of created_at: datetimes (naive ones and ISO 8601 strings without offset are UTC), the first tweet
+# id of a time (ids are snowflakes since Nov 2010, with their creation time in ms after the Twitter epoch, None before) and
+# the creation time of a status
+#--------------------------------------------------------------------------------------------------------------------------
+twitter_epoch = 1288834974657
+first_snowflake_id = 29700859247
+
+def utc_datetime(value):
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    return value if value.tzinfo is not None else value.replace(tzinfo = datetime.timezone.utc)
+
+def snowflake_id(moment):
+    milliseconds = round(moment.timestamp() * 1000) - twitter_epoch
+    return milliseconds << 22 if milliseconds << 22 > first_snowflake_id else None
+
+def status_time(status):
+    if status['id'] > first_snowflake_id:
+        return datetime.datetime.fromtimestamp(((status['id'] >> 22) + twitter_epoch) / 1000, tz = datetime.timezone.utc)
+    return datetime.datetime.strptime(status['created_at'], '%a %b %d %H:%M:%S %z %Y')
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to precompute the field paths to flatten tweets with the given keys, returns (final columns, spec).
+# The spec groups fields by nested dictionary: (path to the dictionary, getter of its fields, fallback getter)
+#--------------------------------------------------------------------------------------------------------------------------
+def build_flat_spec(keys, in_user_cols, in_entities_cols, dict_changer, select = None):
+    columns = []
+    # Groups as [path to the dictionary, keys to take, fallback keys]
+    groups = []
+    # Final column names that are flattened (all of them when select is None)
+    selected = lambda name: select is None or name in select
+    for key in keys:
+        # Target node (quoted_status.user or retweeted_status.user) and source node
+        if key in ['quoted_status', 'retweeted_status', 'user']:
+            prefix = key + '.user.' if key != 'user' else 'user.'
+            path = (key, 'user') if key != 'user' else (key,)
+            group_keys = [i for i in in_user_cols if selected(dict_changer.get(prefix + i, prefix + i))]
+            if group_keys:
+                columns += [dict_changer.get(prefix + i, prefix + i) for i in group_keys]
+                groups.append([path, group_keys, None])
+        # Entities items
+        elif key == 'entities':
+            group_keys = [i for i in in_entities_cols if selected('entities.'+ i)]
+            if group_keys:
+                columns += ['entities.'+ i for i in group_keys]
+                groups.append([(key,), group_keys, None])
+        # If we don't have an extended tweet, it will take the 'text' value
+        elif key == 'full_text':
+            if selected(dict_changer.get(key, key)):
+                columns.append(dict_changer.get(key, key))
+                groups.append([(), [key], ['text']])
+        # Any other key, consecutive ones are taken together
+        elif selected(dict_changer.get(key, key)):
+            columns.append(dict_changer.get(key, key))
+            if groups and groups[-1][0] == () and groups[-1][2] is None:
+                groups[-1][1].append(key)
+            else:
+                groups.append([(), [key], None])
+    spec = [(path, tuple_getter(group_keys), tuple_getter(fallback) if fallback else None)
+            for path, group_keys, fallback in groups]
+    return columns, spec
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to create a getter that returns a tuple with the values of some keys of a dictionary
+#--------------------------------------------------------------------------------------------------------------------------
+def tuple_getter(keys):
+    getter = operator.itemgetter(*keys)
+    if len(keys) == 1:
+        return lambda dictionary: (getter(dictionary),)
+    return getter
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to flatten a tweet dictionary with a spec from build_flat_spec, returns the list of values
+#--------------------------------------------------------------------------------------------------------------------------
+def flatten_status(newtweet, spec):
+    values = []
+    for path, getter, fallback in spec:
+        item = newtweet
+        for key in path:
+            item = item[key]
+        try:
+            values += getter(item)
+        except KeyError:
+            if fallback is None:
+                raise
+            values += fallback(item)
+    return values
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to read a 'tweepy.models.Status' or 'tweepy.models.User' object as a Dictionary, without copying it.
+# Plain dictionaries are returned as they are. Use jsonify_tweepy when the dictionary is going to be modified
+#--------------------------------------------------------------------------------------------------------------------------
+def tweepy_json(tweepy_object):
+    return getattr(tweepy_object, '_json', tweepy_object)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to transform a 'tweepy.models.Status' object into an independent copy of its Dictionary 
+#--------------------------------------------------------------------------------------------------------------------------
+def jsonify_tweepy(tweepy_object):
+    # Write and read back the tweepy's json object, a deep copy of the dictionary (faster than copy.deepcopy)
+    return json.loads(json.dumps(tweepy_json(tweepy_object)))
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to add Giver and Balanced Metrics columns, for each prefix of user columns (e.g. 'source_node.')
+#--------------------------------------------------------------------------------------------------------------------------
+def add_metrics(df, prefixes = ['']):
+    # Create final column for Giver Metric (unless the columns were left out of a projection)
+    for prefix in prefixes:
+        if prefix+'favourites_count' in df and prefix+'statuses_count' in df:
+            df[prefix+'Giver'] = df[prefix+'favourites_count'] / df[prefix+'statuses_count']
+    # Create final column for Balanced Metric
+    for prefix in prefixes:
+        if prefix+'friends_count' in df and prefix+'followers_count' in df:
+            df[prefix+'Balanced'] = df[prefix+'friends_count'] / df[prefix+'followers_count']
+    return df
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Generator of dataframes from an iterable of row dictionaries, by chunks of rows with the index running between chunks.
+# When there are no rows at all, a single empty dataframe is generated so the output is still created with its columns
+#--------------------------------------------------------------------------------------------------------------------------
+def frame_chunks(rows, columns, chunksize = 1000, prefixes = [''], metrics = None):
+    written = 0
+    rows = iter(rows)
+    while True:
+        # Next chunk of rows
+        chunk = list(itertools.islice(rows, chunksize))
+        if not chunk and written:
+            return
+        # Transform into dataframe
+        with stage_timer(metrics, 'frames'):
+            df = pd.DataFrame.from_records(chunk, columns = columns)
+            # Set afterwards, from_records reads an empty range as a list of index fields
+            df.index = range(written, written + len(chunk))
+            add_metrics(df, prefixes = prefixes)
+        yield df
+        written += len(chunk)
+        if len(chunk) < chunksize:
+            return
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to import pyarrow, only required by the Parquet and Feather writers
+#--------------------------------------------------------------------------------------------------------------------------
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet and Feather outputs require pyarrow, install it with: pip install pyarrow')
+    return pyarrow
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to import aiohttp, only required by AsyncAPI
+#--------------------------------------------------------------------------------------------------------------------------
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('AsyncAPI requires aiohttp, install it with: pip install aiohttp')
+    return aiohttp
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to transform a dataframe into a pyarrow Table with the types of a schema (list of (column, type)).
+# Missing columns are filled with nulls, and a 'date' column is added from created_at when it is a partition column
+#--------------------------------------------------------------------------------------------------------------------------
+def arrow_table(df, schema = None, partition_cols = None):
+    pa = import_pyarrow()
+    if schema is None:
+        return pa.Table.from_pandas(df, preserve_index = False)
+    types = {'int64': pa.int64(), 'float64': pa.float64(), 'bool': pa.bool_(), 'string': pa.string(),
+             'timestamp': pa.timestamp('ms', tz = 'UTC'), 'list<string>': pa.list_(pa.string())}
+    arrays = {}
+    for name, kind in schema:
+        # Columns of an empty dataframe (float64 after a reindex) are not converted to the schema types
+        if len(df) == 0:
+            arrays[name] = pa.array([], type = types[kind])
+            continue
+        values = df[name] if name in df else pd.Series([None] * len(df), index = df.index, dtype = object)
+        # Partition columns are read back as categories
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        # Twitter dates, e.g. 'Wed Mar 02 10:00:00 +0000 2022'
+        if kind == 'timestamp' and not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values, format = '%a %b %d %H:%M:%S %z %Y', utc = True)
+        # Entities as lists of hashtags texts or mentioned screen names
+        elif kind == 'list<string>':
+            values = values.map(entity_texts)
+        arrays[name] = pa.array(values, type = types[kind], from_pandas = True)
+    if partition_cols and 'date' in partition_cols and 'date' not in arrays:
+        arrays['date'] = arrays['created_at'].cast(pa.date32())
+    return pa.table(arrays)
+
+#--------------------------------------------------------------------------------------------------------------------------
+# Function to transform a list of entities (hashtags or user mentions) into a list of texts
+#--------------------------------------------------------------------------------------------------------------------------
+def entity_texts(items):
+    if items is None or isinstance(items, float):
+        return None
+    return [item.get('text', item.get('screen_name')) if isinstance(item, dict) else item for item in items]
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Precompiled patterns of the text cleaner, in order of use
+# -------------------------------------------------------------------------------------------------------------------------------
+mention_pattern = re.compile(r'@[A-Za-z0-9]+')
+hashtag_pattern = re.compile(r'#')
+retweet_pattern = re.compile(r'RT[\s]+')
+url_pattern = re.compile(r'https?://(www\.)?(\w+)(\.\w+)')
+punctuation_pattern = re.compile(r'[%s]' % re.escape(string.punctuation))
+apostrophe_pattern = re.compile(r'’')
+number_pattern = re.compile(r'\w*\d\w*')
+email_pattern = re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+')
+emoji_pattern = re.compile(pattern = "["
+    u"\U0001F600-\U0001F64F"  # emoticons
+    u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+    u"\U0001F680-\U0001F6FF"  # transport & map symbols
+    u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
+                       "]+", flags = re.UNICODE)
+
+# Equivalent patterns used by cleanText_batch: runs of punctuations at once, and words with numbers in two steps that only
+# start on a digit or a marker (instead of trying a match from every character)
+punctuation_run_pattern = re.compile(r'[%s]+' % re.escape(string.punctuation + '’'))
+number_tail_pattern = re.compile(r'\d\w*')
+number_head_pattern = re.compile('\x01\\w*')
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Twitter text cleaner, additional method
+# -------------------------------------------------------------------------------------------------------------------------------
+def cleanText(text):
+    # Remove @mentions
+    text = mention_pattern.sub('', text)
+    # Remove hashtags, just the numeral
+    text = hashtag_pattern.sub('', text)
+    # Remove tweets with Retweets followed by one or more whitespaces
+    text = retweet_pattern.sub('', text)
+    # Get rid of an URL or hypelink
+    text = url_pattern.sub('', text)
+    # Remove words with punctuations
+    text = punctuation_pattern.sub('', text)
+    text = apostrophe_pattern.sub('', text)
+    # Remove words with numbers 
+    text = number_pattern.sub('', text)
+    # Remove emojis
+    text = deEmojify(text)
+    # Remove emails
+    text = email_pattern.sub('', text)
+    # Lowercase the text
+    text = text.lower()
+    return text
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Twitter text cleaner for many texts at once (pandas Series or list), same output as cleanText on each text.
+# Texts are joined with a separator that no pattern can match, so each pattern runs once by chunk instead of once by text.
+# ASCII texts are joined apart from the rest, they are faster to scan and can't contain emojis
+# -------------------------------------------------------------------------------------------------------------------------------
+def cleanText_batch(texts, chunksize = 100000):
+    texts_list = list(texts)
+    cleaned = [None] * len(texts_list)
+    for i in range(0, len(texts_list), chunksize):
+        positions = range(i, min(i + chunksize, len(texts_list)))
+        ascii_positions = [j for j in positions if texts_list[j].isascii()]
+        other_positions = [j for j in positions if not texts_list[j].isascii()]
+        for group, emojis in [(ascii_positions, False), (other_positions, True)]:
+            group_texts = [texts_list[j] for j in group]
+            for j, text in zip(group, clean_joined(group_texts, emojis)):
+                cleaned[j] = text
+    # Keep the index of pandas Series
+    if isinstance(texts, pd.Series):
+        return pd.Series(cleaned, index = texts.index, name = texts.name)
+    return cleaned
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Function to apply the cleanText steps on a list of texts joined in a single string
+# -------------------------------------------------------------------------------------------------------------------------------
+def clean_joined(texts, emojis = True):
+    text = '\x00'.join(texts)
+    # Texts containing the separator or the marker are cleaned one by one
+    if text.count('\x00') != max(len(texts) - 1, 0) or '\x01' in text:
+        return [cleanText(item) for item in texts]
+    # Remove @mentions
+    text = mention_pattern.sub('', text)
+    # Remove hashtags, just the numeral
+    text = text.replace('#', '')
+    # Remove tweets with Retweets followed by one or more whitespaces
+    text = retweet_pattern.sub('', text)
+    # Get rid of an URL or hypelink
+    text = url_pattern.sub('', text)
+    # Remove words with punctuations and apostrophes
+    text = punctuation_run_pattern.sub('', text)
+    # Remove words with numbers: from the first number to the end of the word is replaced by a marker, then the marker
+    # and the start of the word are removed on the reversed text
+    text = number_tail_pattern.sub('\x01', text)
+    text = number_head_pattern.sub('', text[::-1])[::-1]
+    # Remove emojis
+    if emojis:
+        text = emoji_pattern.sub('', text)
+    # Emails are not searched, their '@' was already removed with the punctuations
+    # Lowercase the text
+    text = text.lower()
+    return text.split('\x00') if texts else []
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# Emoji remover by @Abdul-Razak Adam https://stackoverflow.com/questions/33404752/removing-emojis-from-a-string-in-python
+# -------------------------------------------------------------------------------------------------------------------------------
+def deEmojify(text):
+    return emoji_pattern.sub(r'',text)
+
+# -------------------------------------------------------------------------------------------------------------------------------
+# About script
+# -------------------------------------------------------------------------------------------------------------------------------
 #   Developed by @robguilarr on March 2022, tested using tweepy 4.4.0
\ No newline at end of file